@@ -12,32 +12,46 @@ import math
 import csv
 import unicodedata
 import json
-from collections import defaultdict
+import itertools
+import heapq
+import functools
+from collections import Counter, defaultdict
 import datetime
+import time
 import sys
 
+# Módulos usados só por etapas opcionais (cache, municípios, GraphML,
+# endereçamento, configs, processos, transbordo, --watch) são importados
+# nas próprias funções: execuções curtas e --version/--help não pagam por eles
+
 # Versão do script
-VERSION = "A1.06"  # Atualizada para refletir mudanças
+VERSION = "A1.11"  # Atualizada para refletir mudanças
+
+def ler_configuracao(caminho_config):
+    """Lê as configurações de um arquivo JSON (OSError, ValueError, KeyError ou TypeError se inválido)"""
+    with open(caminho_config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    
+    # Converter coordenadas de PTTs para tuplas
+    config['PTTS'] = [tuple(item) for item in config['PTTS']]
+    
+    # Converter cidades por UF para listas de tuplas
+    for uf in config['CIDADES_UF']:
+        config['CIDADES_UF'][uf] = [tuple(cidade) for cidade in config['CIDADES_UF'][uf]]
+    
+    return config
 
 def carregar_configuracao(caminho_config):
     """Carrega as configurações de um arquivo JSON"""
     try:
-        with open(caminho_config, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            
-            # Converter coordenadas de PTTs para tuplas
-            config['PTTS'] = [tuple(item) for item in config['PTTS']]
-            
-            # Converter cidades por UF para listas de tuplas
-            for uf in config['CIDADES_UF']:
-                config['CIDADES_UF'][uf] = [tuple(cidade) for cidade in config['CIDADES_UF'][uf]]
-                
-            return config
+        return ler_configuracao(caminho_config)
     except Exception as e:
         print(f"ERRO: Falha ao carregar arquivo de configuração: {str(e)}")
         sys.exit(1)
 
-# Função para remover acentos e caracteres especiais
+# Função para remover acentos e caracteres especiais (memorizada: os mesmos
+# nomes de cidade, camada e região se repetem em todas as linhas)
+@functools.lru_cache(maxsize=1 << 16)
 def remover_acentos(texto):
     """Remove acentos, caracteres especiais e normaliza strings"""
     if not texto:
@@ -84,11 +98,11 @@ def decimal_to_dms(decimal, coord_type):
     
     return f"{degrees}.{minutes}.{seconds}{direction}"
 
-def gerar_siteid(uf, cidade, tipo_elemento, contador, abreviacoes):
-    """Gera um siteid único para o elemento"""
+def gerar_siteid(uf, cidade, tipo_elemento, contador, abreviacoes, largura=3):
+    """Gera um siteid único para o elemento (contador com 'largura' dígitos)"""
     cidade_norm = normalize_str(cidade)
     abrev = abreviacoes[tipo_elemento]
-    return f"{uf}{cidade_norm}0{abrev}{contador:03d}"
+    return f"{uf}{cidade_norm}0{abrev}{contador:0{largura}d}"
 
 def obter_regiao(uf, regioes_config):
     """Obtém a região geográfica a partir da UF"""
@@ -110,628 +124,1004 @@ def gerar_siteid_ptt(cidade):
     cidade_norm = normalize_str(cidade).replace(" ", "").upper()
     return f"PTT_{cidade_norm}"
 
-def main():
-    
-    help_text = f"""
-GERADOR DE ELEMENTOS E CONEXÕES DE REDE PARA BACKBONE NACIONAL PARA LABORATÓRIO {VERSION}
-====================================================
-
-⭐ VISÃO GERAL
---------------
-Gera arquivos CSV para modelagem de redes backbone hierárquicas:
-  elementos.csv    -> Equipamentos e atributos
-  conexoes.csv     -> Interconexões entre dispositivos
-  localidades.csv  -> Dados geográficos (coordenadas DMS)
-
-🚀 COMO USAR
-------------
-Formato básico:
-  python GeradorBackbone.py [OPÇÕES]
-
-Exemplos:
-  1. Topologia padrão (300 elementos):
-     python GeradorBackbone.py
-  
-  2. Topologia personalizada (500 elementos):
-     python GeradorBackbone.py -e 500 -c meu_config.json
-
-⚙️ ARGUMENTOS:
---------------
-  -e  Quantidade total de elementos (30-1000, padrão: 300)
-  -c  Caminho para arquivo de configuração (padrão: config.json)
-
-🔧 PERSONALIZAÇÃO AVANÇADA (config.json)
-----------------------------------------
-Customize proporções e hierarquia editando:
-1. PROPORCAO_CAMADAS:
-   • Ajuste % de cada camada (ex: {{"RTIC": 0.03}} = 3% de RTICs)
-   • Camadas: RTIC, RTRR, RTPR, RTED, SWAC
-
-2. PROPORCOES_REGIAO:
-   • Redistribua elementos por região (ex: {{"Sudeste": 0.5}} = 50% no Sudeste)
-   • Regiões: Norte, Nordeste, Centro-Oeste, Sudeste, Sul
-
-3. REGIOES_HIERARQUIA:
-   • Defina hubs estratégicos e sub-regiões
-   • Exemplo: 
-        "Sudeste": {{
-            "hubs": ["São Paulo", "Rio de Janeiro"],
-            "sub-regioes": {{ ... }}
-        }}
-
-4. CIDADES_UF:
-   • Adicione novas cidades por UF:
-        "SP": [ 
-            ["Novo Município", -23.55, -46.63],
-            ...
-        ]
-
-📂 SAÍDA GERADA
----------------
-	Pasta: TOPOLOGIA_[QTD]_[TIMESTAMP]/
-	├── elementos.csv    # Equipamentos (siteid, camada, nível)
-	├── conexoes.csv     # Conexões (ponta-a, ponta-b, tipo)
-	├── localidades.csv  # Coordenadas (DMS) e região
-	└── resumo.txt       # Estatísticas da topologia
-
-🏗️ HIERARQUIA DA REDE (5 Camadas)
----------------------------------
-1. INNER-CORE (RTIC: 2%):
-   - Núcleo de alta capacidade
-   - Forma anéis regionais + backbone nacional
-   - Localização: Hubs estratégicos (ex: São Paulo)
-
-2. REFLECTOR (RTRR: 3%):
-   - Agregação regional
-   - Conectado a 2 RTICs
-   - Localização: Capitais de sub-regiões
-
-3. PEERING (RTPR: 3%):
-   - Interconexão com IXPs
-   - Conectado a 2 RTICs
-   - Localização: Proximidade a PTTs
+# Largura mínima do contador no fim do siteid (LARGURA_CONTADOR_SITEID no config a fixa)
+LARGURA_CONTADOR_SITEID = 3
 
-4. EDGE (RTED: 12%):
-   - Borda de rede
-   - Operam em pares georredudantes
-   - Conectados a RTICs e SWACs
+class RegistroNomes:
+    """Registro central dos nomes e siteids alocados em uma geração.
+    
+    Guarda nomes e siteids em conjuntos (colisão detectada em O(1)) na forma
+    gravada nos CSVs, sem acentos. Os contadores dos siteids ficam por prefixo
+    (UF + cidade + camada): cidades que normalizam para o mesmo prefixo
+    compartilham a sequência em vez de repetir siteids. O contador tem largura
+    fixa; passar do limite é erro em vez de alargar o campo. As strings são
+    internadas (sys.intern).
+    """
+    
+    def __init__(self, abreviacoes, largura_contador=LARGURA_CONTADOR_SITEID):
+        self.abreviacoes = abreviacoes
+        self.largura_contador = largura_contador
+        self.limite_contador = 10 ** largura_contador - 1
+        self.nomes = set()
+        self.siteids = set()
+        self.contadores = defaultdict(int)
+    
+    def nome(self, nome, verificar=True):
+        """Registra um nome de elemento; nome repetido é erro de geração.
+        
+        Com verificar=False o nome não entra no conjunto (camadas cujos nomes
+        já são únicos pela forma, quando a memória é limitada).
+        """
+        if not verificar:
+            return sys.intern(nome)
+        chave = remover_acentos(nome)
+        if chave in self.nomes:
+            raise ValueError(f"Nome de elemento duplicado: {chave}")
+        self.nomes.add(chave)
+        return sys.intern(nome)
+    
+    def nome_unico(self, nome):
+        """Registra 'nome' ou, se já existir, 'nome-2', 'nome-3'... (PTTs)"""
+        return self.nome(self._desambiguar(nome, self.nomes, "-"))
+    
+    def siteid(self, uf, cidade, tipo, verificar=True):
+        """Próximo siteid da cidade para a camada: {UF}{CID}0{ABREV}{contador}"""
+        prefixo = f"{uf}{normalize_str(cidade)}0{self.abreviacoes[tipo]}"
+        contador = self.contadores[prefixo] + 1
+        if contador > self.limite_contador:
+            raise ValueError(
+                f"Contador do siteid {prefixo} passou de {self.limite_contador}; "
+                f"aumente LARGURA_CONTADOR_SITEID no config (atual: {self.largura_contador})"
+            )
+        self.contadores[prefixo] = contador
+        siteid = gerar_siteid(uf, cidade, tipo, contador, self.abreviacoes, self.largura_contador)
+        return self._registrar_siteid(siteid) if verificar else sys.intern(siteid)
+    
+    def reservar(self, nome, siteid):
+        """Registra nome e siteid já alocados (blocos reaproveitados de outra geração)"""
+        self.nome(nome)
+        self._registrar_siteid(siteid)
+    
+    def siteid_unico(self, siteid):
+        """Registra 'siteid' ou, se já existir, 'siteid2', 'siteid3'... (PTTs)"""
+        return self._registrar_siteid(self._desambiguar(siteid, self.siteids, ""))
+    
+    def _registrar_siteid(self, siteid):
+        chave = remover_acentos(siteid)
+        if chave in self.siteids:
+            raise ValueError(f"Siteid duplicado: {chave}")
+        self.siteids.add(chave)
+        return sys.intern(siteid)
+    
+    @staticmethod
+    def _desambiguar(valor, existentes, separador):
+        candidato, n = valor, 1
+        while remover_acentos(candidato) in existentes:
+            n += 1
+            candidato = f"{valor}{separador}{n}"
+        return candidato
 
-5. METRO (SWAC: 80%):
-   - Acesso metropolitano
-   - Organizados em anéis locais
-   - Conectados a pares de RTEDs
+# Campos dos arquivos CSV de saída
+CAMPOS_ELEMENTOS = ["elemento", "camada", "nivel", "cor", "siteid", "apelido"]
+CAMPOS_CONEXOES = ["ponta-a", "ponta-b", "textoconexao",
+                   "strokeWidth", "strokeColor", "dashed",
+                   "fontStyle", "fontSize"]
+CAMPOS_LOCALIDADES = ["siteid", "Localidade", "RegiaoGeografica", "Latitude", "Longitude"]
 
-⚠️ LIMITAÇÕES IMPORTANTES
--------------------------
-• Quantidade mínima: 30 elementos
-• Máximo recomendado: 1000 elementos
-   - Limite de renderização em ferramentas visuais
-   - Desempenho degradado acima disso
-• PTTs são OBRIGATÓRIOS:
-   - Sem PTTs em uma região = menor redundância
-   - Adicione todos PTTs relevantes no config.json
+def criar_elemento(nome, camada, nivel, siteid, cidade, tipo, regiao):
+    """Monta o registro de um elemento a partir da cidade (nome, uf, lat, lon)"""
+    return {
+        "elemento": nome,
+        "camada": camada,
+        "nivel": nivel,
+        "cor": "",
+        "siteid": siteid,
+        "apelido": "",
+        "cidade": cidade[0],
+        "uf": cidade[1],
+        "lat": cidade[2],
+        "lon": cidade[3],
+        "tipo": tipo,
+        "regiao": regiao
+    }
 
-🔍 EXEMPLO DE CUSTOMIZAÇÃO
---------------------------
-Para criar topologia com:
-- 20% de RTICs
-- 60% no Nordeste
-Edite config.json:
-{{
-  "PROPORCAO_CAMADAS": {{
-    "RTIC": 0.20,   # << Aumentado para 20%
-    ... 
-  }},
-  "PROPORCOES_REGIAO": {{
-    "Nordeste": 0.6, # << 60% dos elementos
-    ...
-  }}
-}}
+def criar_conexao(ponta_a, ponta_b, textoconexao, tipo):
+    """Monta o registro de uma conexão entre dois elementos (tipo: ex. CORE_RING)"""
+    return {
+        "ponta-a": ponta_a,
+        "ponta-b": ponta_b,
+        "textoconexao": textoconexao,
+        "tipo": tipo,
+        "strokeWidth": "",
+        "strokeColor": "",
+        "dashed": "",
+        "fontStyle": "",
+        "fontSize": ""
+    }
 
-💡 DICAS RÁPIDAS
-----------------
-• Combine com GeradorTopologias para visualização com o .drawio, disponível em:
-	https://github.com/flashbsb/Network-Topology-Generator-for-Drawio
-• Use coordenadas reais em CIDADES_UF para precisão geográfica
-• Monitore resumo.txt para validar distribuição
-• Atualizações em: 
-	https://github.com/flashbsb/Backbone-Network-Topology-Generator
-"""
-    # Cria o parser com a descrição completa
-    parser = argparse.ArgumentParser(
-        description=help_text,  # Usa o texto completo de ajuda aqui
-        formatter_class=argparse.RawTextHelpFormatter
-    )   
+def repartir(total, pesos, minimos=None, maximos=None):
+    """Reparte 'total' entre as chaves de 'pesos' pelo método dos maiores restos.
     
-    parser.add_argument(
-        '-e', 
-        type=int, 
-        default=300,
-        help='Quantidade total de elementos (padrão: 300)'
-    )
+    Respeita 'minimos' e 'maximos' por chave: quem ficaria abaixo do mínimo
+    (ou acima do máximo) é fixado no limite e o restante é repartido de novo
+    entre as demais. A soma é exatamente 'total', salvo quando ele não cabe
+    entre a soma dos mínimos e a dos máximos (aí prevalece o limite). Empates
+    de resto vão para a chave que aparece primeiro em 'pesos'.
+    """
+    from fractions import Fraction
     
-    parser.add_argument(
-        '-c',
-        type=str,
-        default='config.json',
-        help='Caminho para o arquivo de configuração (padrão: config.json)'
-    )
+    minimos = minimos or {}
+    maximos = maximos or {}
+    chaves = list(pesos)
+    minimo = {k: minimos.get(k, 0) for k in chaves}
+    maximo = {k: maximos.get(k, math.inf) for k in chaves}
+    total = max(sum(minimo.values()), min(total, sum(maximo.values())))
     
-    args = parser.parse_args()
-
-
-    if args.e < 30:
-        print("ERRO: Quantidade mínima de elementos é 30")
-        sys.exit(1)
+    fixados = {}
+    while True:
+        livres = [k for k in chaves if k not in fixados]
+        resto = total - sum(fixados.values())
+        peso_total = sum(Fraction(pesos[k]) for k in livres)
+        if peso_total > 0:
+            cotas = {k: resto * Fraction(pesos[k]) / peso_total for k in livres}
+        else:
+            cotas = {k: Fraction(resto, len(livres)) for k in livres} if livres else {}
+        
+        abaixo = [k for k in livres if cotas[k] < minimo[k]]
+        acima = [k for k in livres if cotas[k] > maximo[k]]
+        if not abaixo and not acima:
+            break
+        for k in abaixo or acima:
+            fixados[k] = minimo[k] if abaixo else maximo[k]
     
-    # 1. Carregar configuração
-    config = carregar_configuracao(args.c)
+    resultado = {k: fixados[k] if k in fixados else math.floor(cotas[k]) for k in chaves}
+    sobra = total - sum(resultado.values())
+    for k in sorted(cotas, key=lambda k: (-(cotas[k] - resultado[k]), chaves.index(k))):
+        if sobra <= 0:
+            break
+        if resultado[k] < maximo[k]:
+            resultado[k] += 1
+            sobra -= 1
+    return resultado
+
+def calcular_distribuicao(config, total_elementos):
+    """Calcula as quantidades por camada e, dentro de cada camada, por região.
     
-    # Extrair configurações
+    Os PTTs do config fazem parte do total; o restante é repartido entre as
+    camadas (PROPORCAO_CAMADAS) e cada camada entre as regiões
+    (PROPORCOES_REGIAO) com repartir(), então as contagens somam exatamente
+    total_elementos sempre que os mínimos cabem nele. Mínimos: os hubs e um
+    RTRR por sub-região (ao menos um RTIC/RTRR por região), um RTPR e um par
+    de RTEDs por região com cidades. RTIC e RTRR usam no máximo uma cidade
+    cada, e RTED é repartido em pares.
+    """
     PROPORCAO_CAMADAS = config["PROPORCAO_CAMADAS"]
     PROPORCOES_REGIAO = config["PROPORCOES_REGIAO"]
-    REGIOES_HIERARQUIA = config["REGIOES_HIERARQUIA"]
-    ABREVIACOES = config["ABREVIACOES"]
-    REGIOES = config["REGIOES"]
-    PTTS = config["PTTS"]
-    CIDADES_UF = config["CIDADES_UF"]
-    
-    # ========================================================================
-    # ALTERAÇÃO PRINCIPAL: Calcular quantidades por camada usando proporções
-    # ========================================================================
-    
-    # Calcular mínimos obrigatórios baseados na hierarquia
-    min_rtics = 0
-    min_rtrrs = 0
-    for regiao, dados in REGIOES_HIERARQUIA.items():
-        min_rtics += len(dados["hubs"])
-        min_rtrrs += len(dados["sub-regioes"])
-    
-    # Calcular quantidades com base nas proporções
-    dist_real = {
-        "RTIC": max(min_rtics, round(PROPORCAO_CAMADAS["RTIC"] * args.e)),
-        "RTRR": max(min_rtrrs, round(PROPORCAO_CAMADAS["RTRR"] * args.e)),
-        "RTPR": round(PROPORCAO_CAMADAS["RTPR"] * args.e),
-        "RTED": round(PROPORCAO_CAMADAS["RTED"] * args.e),
-        "SWAC": round(PROPORCAO_CAMADAS["SWAC"] * args.e)
-    }
+    cidades_por_regiao = compilar_configuracao(config)["cidades_por_regiao"]
     
-    # Ajustar diferença de arredondamento
-    total_calculado = sum(dist_real.values())
-    diff = args.e - total_calculado
-    if diff != 0:
-        # Ajustar na camada com maior proporção
-        camada_ajuste = max(PROPORCAO_CAMADAS, key=PROPORCAO_CAMADAS.get)
-        dist_real[camada_ajuste] += diff
+    # Limites por região, conforme as cidades disponíveis
+    minimos = {camada: {} for camada in PROPORCAO_CAMADAS}
+    maximos = {camada: {} for camada in PROPORCAO_CAMADAS}
+    for regiao in PROPORCOES_REGIAO:
+        cidades = cidades_por_regiao.get(regiao, [])
+        hierarquia = config["REGIOES_HIERARQUIA"].get(regiao, {"hubs": [], "sub-regioes": {}})
+        nomes = {c[0] for c in cidades}
+        hubs = sum(1 for hub in hierarquia["hubs"] if hub in nomes)
+        
+        # Sub-regiões com cidade representativa (primeira UF, sem repetir cidade)
+        usadas = set()
+        representantes = 0
+        for ufs_sub_regiao in hierarquia["sub-regioes"].values():
+            cidade_rep = next((c for c in cidades if c[1] == ufs_sub_regiao[0] and c not in usadas), None)
+            if cidade_rep:
+                usadas.add(cidade_rep)
+                representantes += 1
+        
+        tem_cidades = 1 if cidades else 0
+        minimos["RTIC"][regiao] = max(hubs, tem_cidades)
+        minimos["RTRR"][regiao] = max(representantes, tem_cidades)
+        minimos["RTPR"][regiao] = tem_cidades
+        minimos["RTED"][regiao] = tem_cidades  # em pares
+        maximos["RTIC"][regiao] = maximos["RTRR"][regiao] = len(cidades)
+        if not cidades:
+            maximos["RTPR"][regiao] = maximos["RTED"][regiao] = maximos["SWAC"][regiao] = 0
     
-    # Garantir que RTED seja par
+    # 1º nível: camadas (RTED em número par)
+    total_camadas = total_elementos - len(config["PTTS"])
+    minimos_camada = {camada: sum(minimos[camada].values()) for camada in PROPORCAO_CAMADAS}
+    minimos_camada["RTED"] *= 2
+    maximos_camada = {
+        camada: sum(maximos[camada].values()) for camada in PROPORCAO_CAMADAS
+        if len(maximos[camada]) == len(PROPORCOES_REGIAO)
+    }
+    dist_real = repartir(total_camadas, PROPORCAO_CAMADAS, minimos_camada, maximos_camada)
     if dist_real["RTED"] % 2 != 0:
-        dist_real["RTED"] += 1
-    
-    # 2. Gerar elementos PTT
-    elementos_ptt = []
-    for ptt in PTTS:
-        cidade_ptt = ptt[0]
-        uf_ptt = ptt[1]
-        lat_ptt = ptt[2]
-        lon_ptt = ptt[3]
-        
-        elementos_ptt.append({
-            "elemento": f"PTT-{cidade_ptt[:10]}",
-            "camada": "PTT",
-            "nivel": 10,
-            "cor": "",
-            "siteid": gerar_siteid_ptt(cidade_ptt),
-            "apelido": "",
-            "cidade": cidade_ptt,
-            "uf": uf_ptt,
-            "lat": lat_ptt,
-            "lon": lon_ptt,
-            "tipo": "PTT"
-        })
+        dist_real["RTED"] -= 1
+        if dist_real["RTED"] < minimos_camada["RTED"]:
+            dist_real["RTED"] += 2
+            ajuste = -1
+        else:
+            ajuste = 1
+        # Compensa na maior camada sem limite que ainda comporte o ajuste
+        camada_ajuste = max(
+            (c for c in PROPORCAO_CAMADAS
+             if c != "RTED" and c not in maximos_camada and dist_real[c] + ajuste >= minimos_camada[c]),
+            key=PROPORCAO_CAMADAS.get, default=None
+        )
+        if camada_ajuste is not None:
+            dist_real[camada_ajuste] += ajuste
+    
+    # 2º nível: regiões dentro de cada camada
+    dist_regional = {}
+    for camada, quantidade in dist_real.items():
+        if camada == "RTED":
+            pares = repartir(quantidade // 2, PROPORCOES_REGIAO, minimos[camada], maximos[camada])
+            dist_regional[camada] = {regiao: 2 * qtd for regiao, qtd in pares.items()}
+        else:
+            dist_regional[camada] = repartir(quantidade, PROPORCOES_REGIAO, minimos[camada], maximos[camada])
+    
+    return dist_real, dist_regional
+
+def largura_contador_siteid(config, dist_regional):
+    """Largura do contador dos siteids para uma geração, fixa para toda a execução.
+    
+    Um prefixo de siteid (UF + cidade + abreviação) só recebe elementos de
+    uma região e das camadas com aquela abreviação, então o maior contador
+    possível é a maior soma dessas quantidades em uma região. Sem
+    LARGURA_CONTADOR_SITEID no config, usa o número de dígitos desse limite
+    (no mínimo LARGURA_CONTADOR_SITEID); com a largura fixada no config,
+    é erro (ValueError) se ela não comportar o limite.
+    """
+    limite = 0
+    for abreviacao in set(config["ABREVIACOES"].values()):
+        camadas = [c for c, a in config["ABREVIACOES"].items() if a == abreviacao and c in dist_regional]
+        for regiao in config["PROPORCOES_REGIAO"]:
+            limite = max(limite, sum(dist_regional[c].get(regiao, 0) for c in camadas))
+    
+    largura = config.get("LARGURA_CONTADOR_SITEID")
+    if largura is None:
+        return max(LARGURA_CONTADOR_SITEID, len(str(limite)))
+    if limite > 10 ** largura - 1:
+        raise ValueError(
+            f"LARGURA_CONTADOR_SITEID = {largura} no config não comporta até {limite} siteids "
+            f"por cidade e camada; use pelo menos {len(str(limite))} ou remova a chave"
+        )
+    return largura
+
+def agrupar_cidades_por_regiao(config):
+    """Monta a lista de cidades (nome, uf, lat, lon), incluindo PTTs, agrupada por região
     
-    # 3. Preparar lista completa de cidades
+    A população (4º item opcional de cada cidade em CIDADES_UF) é usada
+    separadamente por pesos_populacao.
+    """
     todas_cidades = []
-    for uf, cidades_uf in CIDADES_UF.items():
+    for uf, cidades_uf in config["CIDADES_UF"].items():
         for cidade in cidades_uf:
             todas_cidades.append((cidade[0], uf, cidade[1], cidade[2]))
     
     # Adicionar PTTs à lista de cidades
-    for ptt in PTTS:
+    for ptt in config["PTTS"]:
         if ptt not in todas_cidades:
             todas_cidades.append((ptt[0], ptt[1], ptt[2], ptt[3]))
     
-    # Agrupar cidades por região
     cidades_por_regiao = defaultdict(list)
     for cidade in todas_cidades:
-        uf = cidade[1]
-        regiao = obter_regiao(uf, REGIOES)
+        regiao = obter_regiao(cidade[1], config["REGIOES"])
         cidades_por_regiao[regiao].append(cidade)
+    return cidades_por_regiao
+
+# Quantidade de cidades vizinhas guardadas por cidade na tabela de vizinhos
+K_VIZINHOS = 16
+
+class IndiceEspacial:
+    """Grade espacial de 'celula' graus sobre uma lista de coordenadas.
     
-    # Calcular distribuição regional proporcional
-    dist_regional = {}
-    total_elementos = args.e
-    for regiao, proporcao in PROPORCOES_REGIAO.items():
-        dist_regional[regiao] = round(proporcao * total_elementos)
-    
-    # Ajustar diferença de arredondamento
-    diff = total_elementos - sum(dist_regional.values())
-    if diff != 0:
-        regiao_maior = max(PROPORCOES_REGIAO, key=PROPORCOES_REGIAO.get)
-        dist_regional[regiao_maior] += diff
- 
-    # 4. Inicializar lista de elementos COM OS PTTs
-    elementos = elementos_ptt.copy()  # Mantemos os PTTs aqui
- 
-    # Dicionários para armazenar elementos
-    site_contadores = defaultdict(lambda: defaultdict(int))
+    proximos() expande a busca em anéis de células até que nenhum ponto fora
+    deles possa estar mais perto que o k-ésimo encontrado, então o resultado
+    é exato (mesmas distâncias de distancia_geografica).
+    """
+    
+    def __init__(self, coordenadas, celula=1.0):
+        self.coordenadas = coordenadas
+        self.celula = celula
+        self.grade = defaultdict(list)
+        for j, (lat, lon) in enumerate(coordenadas):
+            self.grade[(math.floor(lat / celula), math.floor(lon / celula))].append(j)
+        linhas = [chave[0] for chave in self.grade] or [0]
+        colunas = [chave[1] for chave in self.grade] or [0]
+        self.linhas = (min(linhas), max(linhas))
+        self.colunas = (min(colunas), max(colunas))
+        
+        # Limite inferior (km) da distância até um ponto fora do anel: o
+        # cosseno da latitude média nunca é menor que o da maior |latitude|
+        # (entre os pontos e a consulta)
+        self.cos_min = min((abs(math.cos(math.radians(lat))) for lat, _ in coordenadas), default=1.0)
+    
+    def proximos(self, lat, lon, k, ignorar=None):
+        """Os k pontos mais próximos de (lat, lon), como [(distância, índice)].
+        
+        Ordenados por (distância, índice); 'ignorar(j)' exclui pontos.
+        """
+        linha, coluna = math.floor(lat / self.celula), math.floor(lon / self.celula)
+        # Anel a partir do qual todas as células ocupadas já foram visitadas
+        max_anel = max(
+            abs(linha - self.linhas[0]), abs(linha - self.linhas[1]),
+            abs(coluna - self.colunas[0]), abs(coluna - self.colunas[1])
+        )
+        km_por_anel = self.celula * 111.32 * min(1.0, self.cos_min, abs(math.cos(math.radians(lat))))
+        coordenadas = self.coordenadas
+        candidatos = []
+        anel = 0
+        while True:
+            for dl in range(-anel, anel + 1):
+                # Nas linhas internas do anel só as duas colunas das bordas
+                passo = 1 if abs(dl) == anel else max(2 * anel, 1)
+                for dc in range(-anel, anel + 1, passo):
+                    for j in self.grade.get((linha + dl, coluna + dc), ()):
+                        if ignorar is None or not ignorar(j):
+                            c = coordenadas[j]
+                            candidatos.append((distancia_geografica(lat, lon, c[0], c[1]), j))
+            if anel >= max_anel:
+                break
+            if len(candidatos) >= k:
+                candidatos.sort()
+                if candidatos[k - 1][0] < anel * km_por_anel:
+                    break
+            anel += 1
+        candidatos.sort()
+        return candidatos[:k]
+
+def k_vizinhos(coordenadas, k, ignorar=None, celula=1.0):
+    """Os k pontos mais próximos de cada ponto, como [(distância, índice)].
+    
+    Ordenados por (distância, índice); 'ignorar(i, j)' exclui pares (ex: a
+    própria cidade). Conjuntos pequenos são comparados todos contra todos;
+    os grandes usam IndiceEspacial.
+    """
+    if len(coordenadas) <= 8 * k:
+        resultado = []
+        for i, (lat, lon) in enumerate(coordenadas):
+            candidatos = sorted(
+                (distancia_geografica(lat, lon, c[0], c[1]), j)
+                for j, c in enumerate(coordenadas)
+                if ignorar is None or not ignorar(i, j)
+            )
+            resultado.append(candidatos[:k])
+        return resultado
+    
+    indice = IndiceEspacial(coordenadas, celula)
+    return [
+        indice.proximos(lat, lon, k, None if ignorar is None else (lambda j, i=i: ignorar(i, j)))
+        for i, (lat, lon) in enumerate(coordenadas)
+    ]
+
+def construir_vizinhos(cidades_por_regiao, k=K_VIZINHOS, anterior=None):
+    """Tabela das k cidades mais próximas de cada cidade da mesma região.
+    
+    cidade -> cidades da região (exceto ela), da mais próxima à mais
+    distante; empates seguem a ordem da lista de cidades, como min().
+    Com 'anterior' (outra configuração compilada), regiões com a mesma
+    lista de cidades reaproveitam a tabela já calculada.
+    """
+    vizinhos = {}
+    for regiao, cidades in cidades_por_regiao.items():
+        if anterior is not None and anterior["cidades_por_regiao"].get(regiao) == cidades:
+            for cidade in cidades:
+                vizinhos[cidade] = anterior["vizinhos"][cidade]
+            continue
+        vizinhas = k_vizinhos(
+            [(c[2], c[3]) for c in cidades], k,
+            ignorar=lambda i, j: cidades[i] == cidades[j]
+        )
+        for cidade, lista in zip(cidades, vizinhas):
+            vizinhos[cidade] = [cidades[j] for _, j in lista]
+    return vizinhos
+
+def pesos_populacao(config, cidades_por_regiao):
+    """Pesos acumulados por população para sortear cidades de cada região.
+    
+    Só existe para regiões com população informada em CIDADES_UF; cidades
+    sem população (ex: as vindas de PTTS) têm peso zero. Sem população, o
+    sorteio continua uniforme.
+    """
+    populacao = {}
+    for uf, cidades_uf in config["CIDADES_UF"].items():
+        for cidade in cidades_uf:
+            if len(cidade) > 3 and cidade[3]:
+                populacao[(cidade[0], uf, cidade[1], cidade[2])] = cidade[3]
+    
+    pesos = {}
+    for regiao, cidades in cidades_por_regiao.items():
+        acumulado = list(itertools.accumulate(populacao.get(c, 0) for c in cidades))
+        if acumulado and acumulado[-1] > 0:
+            pesos[regiao] = acumulado
+    return pesos
+
+# Configurações compiladas nesta execução, pelo conteúdo das chaves de que dependem
+_compilados = {}
+
+def compilar_configuracao(config, anterior=None):
+    """Estruturas derivadas do config, calculadas uma vez por execução.
+    
+    Cidades por região, nomes de PTT e a tabela de vizinhos; reaproveitadas
+    por todas as gerações cujo config tenha o mesmo conteúdo em CIDADES_UF,
+    PTTS e REGIOES (um config alterado no lugar é compilado de novo).
+    'anterior' é a compilação de uma versão anterior do config (modo --watch).
+    """
+    import hashlib
+    
+    chave = hashlib.sha256(json.dumps(
+        [config["CIDADES_UF"], config["PTTS"], config["REGIOES"]], ensure_ascii=False
+    ).encode("utf-8")).hexdigest()
+    memo = _compilados.get(chave)
+    if memo is not None:
+        return memo
+    
+    cidades_por_regiao = agrupar_cidades_por_regiao(config)
+    compilado = {
+        "cidades_por_regiao": cidades_por_regiao,
+        "nomes_ptt": {ptt[0] for ptt in config["PTTS"]},
+        "vizinhos": construir_vizinhos(cidades_por_regiao, anterior=anterior),
+        "pesos_populacao": pesos_populacao(config, cidades_por_regiao)
+    }
+    if len(_compilados) >= 8:
+        _compilados.clear()
+    _compilados[chave] = compilado
+    return compilado
+
+class GruposSwac:
+    """SWACs de uma geração (nome, lat, lon), agrupados por região e cidade.
+    
+    Sem limiar de transbordo, ficam em listas por cidade. Com 'limiar_kb',
+    a memória residente é conferida a cada 4096 SWACs; ao passar do limiar,
+    os grupos vão para blocos temporários em disco, um arquivo por região e
+    bloco, ordenados por (ordem da cidade, sequência). A partir daí os novos
+    SWACs se acumulam até metade do que havia na memória no transbordo e
+    viram outro bloco. regiao() devolve as cidades na ordem em que apareceram,
+    mesclando os blocos com heapq.merge: a saída é a mesma com ou sem disco.
+    """
+    
+    def __init__(self, limiar_kb=None):
+        self.limiar_kb = limiar_kb
+        self.grupos = defaultdict(dict)
+        self.chaves = defaultdict(list)
+        self.ordem = {}
+        self.total = 0
+        self.cidades = 0
+        self.transbordou = False
+        self.pasta = None
+        self.blocos = defaultdict(list)
+        self.pendentes = defaultdict(list)
+        self.qtd_pendentes = 0
+        self.limite_pendentes = None
+    
+    def adicionar(self, regiao, chave, swac):
+        ordem = self.ordem.get(chave)
+        if ordem is None:
+            chave = sys.intern(chave)
+            ordem = self.ordem[chave] = len(self.chaves[regiao])
+            self.chaves[regiao].append(chave)
+            self.cidades += 1
+        self.total += 1
+        
+        if self.transbordou:
+            self.pendentes[regiao].append((ordem, self.total, swac[0], swac[1], swac[2]))
+            self.qtd_pendentes += 1
+            if self.qtd_pendentes >= self.limite_pendentes:
+                self._gravar_pendentes()
+            return
+        
+        self.grupos[regiao].setdefault(chave, []).append(swac)
+        if (self.limiar_kb is not None and self.total & 4095 == 0
+                and (rss_atual_kb() or 0) > self.limiar_kb):
+            self._transbordar()
+    
+    def _transbordar(self):
+        import tempfile
+        
+        self.pasta = tempfile.TemporaryDirectory(prefix="gerador_swacs_")
+        self.transbordou = True
+        self.limite_pendentes = max(4096, self.total // 2)
+        seq = 0
+        for regiao, grupos in self.grupos.items():
+            for chave, swacs in grupos.items():
+                ordem = self.ordem[chave]
+                for nome, lat, lon in swacs:
+                    seq += 1
+                    self.pendentes[regiao].append((ordem, seq, nome, lat, lon))
+        self.grupos.clear()
+        self._gravar_pendentes()
+    
+    def _gravar_pendentes(self):
+        for regiao, registros in self.pendentes.items():
+            if not registros:
+                continue
+            registros.sort()
+            caminho = os.path.join(self.pasta.name, f"{len(self.blocos[regiao])}_{remover_acentos(regiao)}.tsv")
+            with open(caminho, "w", encoding="utf-8", newline="\n") as f:
+                for registro in registros:
+                    f.write("%d\t%d\t%s\t%r\t%r\n" % registro)
+            self.blocos[regiao].append(caminho)
+        self.pendentes.clear()
+        self.qtd_pendentes = 0
+    
+    @staticmethod
+    def _ler_bloco(caminho):
+        with open(caminho, "r", encoding="utf-8", newline="\n") as f:
+            for linha in f:
+                ordem, seq, nome, lat, lon = linha.rstrip("\n").split("\t")
+                yield int(ordem), int(seq), nome, float(lat), float(lon)
+    
+    def regiao(self, regiao):
+        """(chave da cidade, [(nome, lat, lon)]) da região, na ordem de aparição das cidades"""
+        if not self.transbordou:
+            yield from self.grupos.get(regiao, {}).items()
+            return
+        
+        pendentes = sorted(self.pendentes.get(regiao, []))
+        registros = heapq.merge(*[self._ler_bloco(caminho) for caminho in self.blocos[regiao]], pendentes)
+        chaves = self.chaves[regiao]
+        for ordem, grupo in itertools.groupby(registros, key=lambda r: r[0]):
+            yield chaves[ordem], [(nome, lat, lon) for _, _, nome, lat, lon in grupo]
+
+def iter_elementos(config, total_elementos, seed=None, estado=None, limiar_transbordo_mb=None, anterior=None):
+    """Gera os elementos da topologia sob demanda, camada por camada.
+    
+    Se 'estado' for informado (dicionário), ele recebe apenas o que as
+    conexões precisam: RTICs, RTRRs, RTPRs, pares de RTED e os SWACs
+    agrupados por região e cidade (GruposSwac em 'swacs'). Passe o mesmo
+    dicionário para iter_conexoes depois de consumir todos os elementos.
+    
+    Com 'limiar_transbordo_mb', os SWACs transbordam para disco quando a
+    memória residente passa do limiar; a partir daí seus nomes e siteids
+    deixam de entrar nos conjuntos de colisão do registro (já são únicos
+    pela forma). As demais camadas continuam em memória: o limiar não é um
+    teto (ver memoria_minima_transbordo_kb).
+    
+    Cada bloco (camada, região) sorteia com um gerador próprio, derivado da
+    semente, e só depende da sua quantidade, das cidades e da hierarquia da
+    região e, nos nomes de RTIC/RTRR, de quantos vieram antes. Com 'anterior'
+    (um dicionário vazio ou o estado de uma geração feita assim), o estado
+    guarda os blocos em 'blocos' e os que tiverem as mesmas entradas que no
+    anterior são reaproveitados em vez de sorteados; as chaves refeitas
+    ficam em 'regenerados' (modo --watch).
+    """
+    if estado is None:
+        estado = {}
+    
+    semente = seed if seed is not None else random.randrange(2**64)
+    REGIOES_HIERARQUIA = config["REGIOES_HIERARQUIA"]
+    ABREVIACOES = config["ABREVIACOES"]
+    compilado = compilar_configuracao(config)
+    nomes_ptt = compilado["nomes_ptt"]
+    cidades_por_regiao = compilado["cidades_por_regiao"]
+    vizinhos_regiao = compilado["vizinhos"]
+    pesos_regiao = compilado["pesos_populacao"]
+    
+    dist_real, dist_regional = calcular_distribuicao(config, total_elementos)
+    
+    largura_contador = largura_contador_siteid(config, dist_regional)
+    registro = RegistroNomes(ABREVIACOES, largura_contador)
     rtics = []
     rtrrs = []
     rtprs = []
     rted_pares = []
-    swacs = []
+    swacs = GruposSwac(None if limiar_transbordo_mb is None else limiar_transbordo_mb * 1024)
+    blocos = None if anterior is None else {}
+    estado.update({
+        "seed": seed,
+        "semente": semente,
+        "compilado": compilado,
+        "registro": registro,
+        "dist_real": dist_real,
+        "dist_regional": dist_regional,
+        "rtics": rtics,
+        "rtrrs": rtrrs,
+        "rtprs": rtprs,
+        "rted_pares": rted_pares,
+        "swacs": swacs,
+        "blocos": blocos,
+        "regenerados": [],
+        "completo": False
+    })
     
-    # ========================================================================
-    # ALTERAÇÃO: Distribuição proporcional de RTICs por região
-    # ========================================================================
+    def sortear_cidade(rng, regiao):
+        # Ponderado pela população quando disponível
+        pesos = pesos_regiao.get(regiao)
+        if pesos is None:
+            return rng.choice(cidades_por_regiao[regiao])
+        return rng.choices(cidades_por_regiao[regiao], cum_weights=pesos)[0]
     
-    # Calcular quantidades de RTICs por região
-    rtics_por_regiao = {}
-    total_rtics = dist_real["RTIC"]
+    def proximo_siteid(cidade, tipo):
+        return registro.siteid(cidade[1], cidade[0], tipo)
     
-    # Distribuição inicial baseada na proporção regional
-    for regiao, proporcao in PROPORCOES_REGIAO.items():
-        rtics_por_regiao[regiao] = max(
-            1,  # Mínimo 1 por região
-            round(proporcao * total_rtics)
+    # 1. Elementos PTT
+    for ptt in config["PTTS"]:
+        yield criar_elemento(
+            registro.nome_unico(f"PTT-{ptt[0][:10]}"), "PTT", 10,
+            registro.siteid_unico(gerar_siteid_ptt(ptt[0])),
+            ptt, "PTT", obter_regiao(ptt[1], config["REGIOES"])
         )
     
-    # Ajustar diferença
-    total_rtics_calculado = sum(rtics_por_regiao.values())
-    if total_rtics_calculado < total_rtics:
-        # Adicionar RTICs extras nas regiões maiores
-        for regiao in sorted(rtics_por_regiao, key=rtics_por_regiao.get, reverse=True):
-            if total_rtics_calculado < total_rtics:
-                rtics_por_regiao[regiao] += 1
-                total_rtics_calculado += 1
-            else:
-                break
-    
-    # Gerar RTICs por região
-    for regiao, qtd_rtics_regiao in rtics_por_regiao.items():
-        # Obter hubs obrigatórios primeiro
-        hubs_obrigatorios = REGIOES_HIERARQUIA[regiao]["hubs"]
+    # 2. RTICs: hubs obrigatórios primeiro, extras priorizando cidades com PTT
+    def bloco_rtic(regiao, qtd_rtics_regiao, rng, inicio):
         cidades_disponiveis = cidades_por_regiao[regiao].copy()
         
-        # Gerar hubs obrigatórios
-        hubs_gerados = []
-        for hub in hubs_obrigatorios:
+        hubs_gerados = 0
+        for hub in REGIOES_HIERARQUIA[regiao]["hubs"]:
             cidade_hub = next((c for c in cidades_disponiveis if c[0] == hub), None)
             if cidade_hub:
-                siteid = gerar_siteid(
-                    cidade_hub[1], cidade_hub[0], "RTIC", 
-                    site_contadores[cidade_hub[1]+cidade_hub[0]]["RTIC"] + 1,
-                    ABREVIACOES
+                yield criar_elemento(
+                    registro.nome(f"RTIC-{hub[:3].upper()}{inicio+hubs_gerados+1:02d}-01"), "INNER-CORE", 1,
+                    proximo_siteid(cidade_hub, "RTIC"), cidade_hub, "RTIC", regiao
                 )
-                site_contadores[cidade_hub[1]+cidade_hub[0]]["RTIC"] += 1
-                
-                elementos.append({
-                    "elemento": f"RTIC-{hub[:3].upper()}{len(rtics)+1:02d}-01",
-                    "camada": "INNER-CORE",
-                    "nivel": 1,
-                    "cor": "",
-                    "siteid": siteid,
-                    "apelido": "",
-                    "cidade": cidade_hub[0],
-                    "uf": cidade_hub[1],
-                    "lat": cidade_hub[2],
-                    "lon": cidade_hub[3],
-                    "tipo": "RTIC"
-                })
-                rtics.append(elementos[-1])
-                hubs_gerados.append(hub)
+                hubs_gerados += 1
                 cidades_disponiveis.remove(cidade_hub)
         
-        # Gerar RTICs extras se necessário
-        rtics_extras = qtd_rtics_regiao - len(hubs_gerados)
+        rtics_extras = qtd_rtics_regiao - hubs_gerados
         if rtics_extras > 0:
-            # Priorizar cidades com PTTs
-            cidades_ptt = [c for c in cidades_disponiveis if c[0] in [p[0] for p in PTTS]]
+            cidades_ptt = [c for c in cidades_disponiveis if c[0] in nomes_ptt]
             if not cidades_ptt:
                 cidades_ptt = cidades_disponiveis
             
-            for _ in range(rtics_extras):
+            for i in range(rtics_extras):
                 if not cidades_ptt:
-                    break
+                    # Cidades com PTT esgotadas: segue pelas demais
+                    cidades_ptt = cidades_disponiveis
+                    if not cidades_ptt:
+                        break
                     
-                cidade = random.choice(cidades_ptt)
-                siteid = gerar_siteid(
-                    cidade[1], cidade[0], "RTIC", 
-                    site_contadores[cidade[1]+cidade[0]]["RTIC"] + 1,
-                    ABREVIACOES
+                cidade = rng.choice(cidades_ptt)
+                yield criar_elemento(
+                    registro.nome(f"RTIC-{cidade[0][:3].upper()}{inicio+hubs_gerados+i+1:02d}-01"), "INNER-CORE", 1,
+                    proximo_siteid(cidade, "RTIC"), cidade, "RTIC", regiao
                 )
-                site_contadores[cidade[1]+cidade[0]]["RTIC"] += 1
-                
-                elementos.append({
-                    "elemento": f"RTIC-{cidade[0][:3].upper()}{len(rtics)+1:02d}-01",
-                    "camada": "INNER-CORE",
-                    "nivel": 1,
-                    "cor": "",
-                    "siteid": siteid,
-                    "apelido": "",
-                    "cidade": cidade[0],
-                    "uf": cidade[1],
-                    "lat": cidade[2],
-                    "lon": cidade[3],
-                    "tipo": "RTIC"
-                })
-                rtics.append(elementos[-1])
                 cidades_ptt.remove(cidade)
                 if cidade in cidades_disponiveis:
                     cidades_disponiveis.remove(cidade)
     
-    # ========================================================================
-    # ALTERAÇÃO: Distribuição proporcional de RTRRs por região
-    # ========================================================================
-    
-    # Calcular quantidades de RTRRs por região
-    rtrrs_por_regiao = {}
-    total_rtrrs = dist_real["RTRR"]
-    
-    # Distribuição baseada na proporção regional
-    for regiao, proporcao in PROPORCOES_REGIAO.items():
-        rtrrs_por_regiao[regiao] = max(
-            1,  # Mínimo 1 por região
-            round(proporcao * total_rtrrs)
-        )
-    
-    # Ajustar diferença
-    total_rtrrs_calculado = sum(rtrrs_por_regiao.values())
-    if total_rtrrs_calculado < total_rtrrs:
-        for regiao in sorted(rtrrs_por_regiao, key=rtrrs_por_regiao.get, reverse=True):
-            if total_rtrrs_calculado < total_rtrrs:
-                rtrrs_por_regiao[regiao] += 1
-                total_rtrrs_calculado += 1
-            else:
-                break
-    
-    # Gerar RTRRs por região
-    for regiao, qtd_rtrrs_regiao in rtrrs_por_regiao.items():
-        # Obter sub-regiões obrigatórias primeiro
-        sub_regioes_obrigatorias = list(REGIOES_HIERARQUIA[regiao]["sub-regioes"].keys())
+    # 3. RTRRs: um por sub-região obrigatória, extras priorizando cidades com PTT
+    def bloco_rtrr(regiao, qtd_rtrrs_regiao, rng, inicio):
+        sub_regioes = REGIOES_HIERARQUIA[regiao]["sub-regioes"]
         cidades_disponiveis = cidades_por_regiao[regiao].copy()
         
-        # Gerar um RTRR por sub-região obrigatória
-        sub_regioes_geradas = []
-        for sub_regiao in sub_regioes_obrigatorias:
+        sub_regioes_geradas = 0
+        for sub_regiao, ufs_sub_regiao in sub_regioes.items():
             # Selecionar cidade representativa (primeira UF da sub-região)
-            uf_rep = REGIOES_HIERARQUIA[regiao]["sub-regioes"][sub_regiao][0]
-            cidades_sub = [c for c in cidades_disponiveis if c[1] == uf_rep]
+            cidades_sub = [c for c in cidades_disponiveis if c[1] == ufs_sub_regiao[0]]
             
             if cidades_sub:
                 cidade_rep = cidades_sub[0]
-                siteid = gerar_siteid(
-                    cidade_rep[1], cidade_rep[0], "RTRR", 
-                    site_contadores[cidade_rep[1]+cidade_rep[0]]["RTRR"] + 1,
-                    ABREVIACOES
+                yield criar_elemento(
+                    registro.nome(f"RTRR-{sub_regiao[:5]}{inicio+sub_regioes_geradas+1:02d}-01"), "REFLECTOR", 3,
+                    proximo_siteid(cidade_rep, "RTRR"), cidade_rep, "RTRR", regiao
                 )
-                site_contadores[cidade_rep[1]+cidade_rep[0]]["RTRR"] += 1
-                
-                elementos.append({
-                    "elemento": f"RTRR-{sub_regiao[:5]}{len(rtrrs)+1:02d}-01",
-                    "camada": "REFLECTOR",
-                    "nivel": 3,
-                    "cor": "",
-                    "siteid": siteid,
-                    "apelido": "",
-                    "cidade": cidade_rep[0],
-                    "uf": cidade_rep[1],
-                    "lat": cidade_rep[2],
-                    "lon": cidade_rep[3],
-                    "tipo": "RTRR"
-                })
-                rtrrs.append(elementos[-1])
-                sub_regioes_geradas.append(sub_regiao)
+                sub_regioes_geradas += 1
                 if cidade_rep in cidades_disponiveis:
                     cidades_disponiveis.remove(cidade_rep)
         
-        # Gerar RTRRs extras se necessário
-        rtrrs_extras = qtd_rtrrs_regiao - len(sub_regioes_geradas)
+        rtrrs_extras = qtd_rtrrs_regiao - sub_regioes_geradas
         if rtrrs_extras > 0:
-            # Priorizar cidades com PTTs
-            cidades_ptt = [c for c in cidades_disponiveis if c[0] in [p[0] for p in PTTS]]
+            cidades_ptt = [c for c in cidades_disponiveis if c[0] in nomes_ptt]
             if not cidades_ptt:
                 cidades_ptt = cidades_disponiveis
             
-            for _ in range(rtrrs_extras):
+            for i in range(rtrrs_extras):
                 if not cidades_ptt:
-                    break
+                    # Cidades com PTT esgotadas: segue pelas demais
+                    cidades_ptt = cidades_disponiveis
+                    if not cidades_ptt:
+                        break
                     
-                cidade = random.choice(cidades_ptt)
-                siteid = gerar_siteid(
-                    cidade[1], cidade[0], "RTRR", 
-                    site_contadores[cidade[1]+cidade[0]]["RTRR"] + 1,
-                    ABREVIACOES
+                cidade = rng.choice(cidades_ptt)
+                yield criar_elemento(
+                    registro.nome(f"RTRR-{cidade[0][:5]}{inicio+sub_regioes_geradas+i+1:02d}-01"), "REFLECTOR", 3,
+                    proximo_siteid(cidade, "RTRR"), cidade, "RTRR", regiao
                 )
-                site_contadores[cidade[1]+cidade[0]]["RTRR"] += 1
-                
-                elementos.append({
-                    "elemento": f"RTRR-{cidade[0][:5]}{len(rtrrs)+1:02d}-01",
-                    "camada": "REFLECTOR",
-                    "nivel": 3,
-                    "cor": "",
-                    "siteid": siteid,
-                    "apelido": "",
-                    "cidade": cidade[0],
-                    "uf": cidade[1],
-                    "lat": cidade[2],
-                    "lon": cidade[3],
-                    "tipo": "RTRR"
-                })
-                rtrrs.append(elementos[-1])
                 cidades_ptt.remove(cidade)
                 if cidade in cidades_disponiveis:
                     cidades_disponiveis.remove(cidade)
     
-    # ========================================================================
-    # GERAR AS DEMAIS CAMADAS (mantido o código original com ajustes)
-    # ========================================================================
-    
-    # 3. Gerar RTPRs (distribuição regional proporcional)
-    for regiao, qtd_regiao in dist_regional.items():
-        qtd_rtpr_regiao = max(1, round(dist_real["RTPR"] * (qtd_regiao / total_elementos)))
+    # 4. RTPRs (distribuição regional proporcional, priorizando cidades com PTT)
+    def bloco_rtpr(regiao, qtd_rtpr_regiao, rng, inicio):
         cidades_regiao = cidades_por_regiao[regiao]
         
         if not cidades_regiao:
-            continue
-            
+            return
+        
+        cidades_ptt = [c for c in cidades_regiao if c[0] in nomes_ptt]
         for i in range(qtd_rtpr_regiao):
-            # Priorizar cidades com PTTs na região
-            cidades_ptt = [c for c in cidades_regiao if c[0] in [p[0] for p in PTTS]]
-            if not cidades_ptt:
-                cidade = random.choice(cidades_regiao)
-            else:
-                cidade = random.choice(cidades_ptt)
-            
-            siteid = gerar_siteid(
-                cidade[1], cidade[0], "RTPR", 
-                site_contadores[cidade[1]+cidade[0]]["RTPR"] + 1,
-                ABREVIACOES
+            cidade = rng.choice(cidades_ptt) if cidades_ptt else sortear_cidade(rng, regiao)
+            yield criar_elemento(
+                registro.nome(f"RTPR-{cidade[1]}{i+1:02d}-01"), "PEERING", 4,
+                proximo_siteid(cidade, "RTPR"), cidade, "RTPR", regiao
             )
-            site_contadores[cidade[1]+cidade[0]]["RTPR"] += 1
-            
-            elementos.append({
-                "elemento": f"RTPR-{cidade[1]}{i+1:02d}-01",
-                "camada": "PEERING",
-                "nivel": 4,
-                "cor": "",
-                "siteid": siteid,
-                "apelido": "",
-                "cidade": cidade[0],
-                "uf": cidade[1],
-                "lat": cidade[2],
-                "lon": cidade[3],
-                "tipo": "RTPR"
-            })
-            rtprs.append(elementos[-1])
-    
-    # 4. Gerar RTEDs em pares (distribuição regional proporcional)
-    for regiao, qtd_regiao in dist_regional.items():
-        qtd_rted_regiao = max(2, round(dist_real["RTED"] * (qtd_regiao / total_elementos)))
-        # Garantir número par
-        if qtd_rted_regiao % 2 != 0:
-            qtd_rted_regiao += 1
-            
+    
+    # 5. RTEDs em pares geograficamente próximos
+    def bloco_rted(regiao, qtd_rted_regiao, rng, inicio):
         cidades_regiao = cidades_por_regiao[regiao]
         
         if not cidades_regiao or qtd_rted_regiao < 2:
-            continue
+            return
             
-        pares_regiao = qtd_rted_regiao // 2
-        for i in range(pares_regiao):
-            # Selecionar cidade base
-            cidade_base = random.choice(cidades_regiao)
+        for i in range(qtd_rted_regiao // 2):
+            cidade_base = sortear_cidade(rng, regiao)
             
-            # Encontrar cidade próxima para o par
-            cidade_par = min(
-                [c for c in cidades_regiao if c != cidade_base],
-                key=lambda c: distancia_geografica(
-                    cidade_base[2], cidade_base[3], c[2], c[3]
-                )
-            )
+            # Cidade mais próxima para o par (a própria, se for a única da região)
+            vizinhas = vizinhos_regiao[cidade_base]
+            cidade_par = vizinhas[0] if vizinhas else cidade_base
             
-            # Criar primeiro elemento do par
-            siteid1 = gerar_siteid(
-                cidade_base[1], cidade_base[0], "RTED", 
-                site_contadores[cidade_base[1]+cidade_base[0]]["RTED"] + 1,
-                ABREVIACOES
+            yield criar_elemento(
+                registro.nome(f"RTED-{cidade_base[1]}{i+1:02d}-01"), "EDGE", 5,
+                proximo_siteid(cidade_base, "RTED"), cidade_base, "RTED", regiao
             )
-            site_contadores[cidade_base[1]+cidade_base[0]]["RTED"] += 1
-            
-            elementos.append({
-                "elemento": f"RTED-{cidade_base[1]}{i+1:02d}-01",
-                "camada": "EDGE",
-                "nivel": 5,
-                "cor": "",
-                "siteid": siteid1,
-                "apelido": "",
-                "cidade": cidade_base[0],
-                "uf": cidade_base[1],
-                "lat": cidade_base[2],
-                "lon": cidade_base[3],
-                "tipo": "RTED"
-            })
-            rted1 = elementos[-1]
-            
-            # Criar segundo elemento do par
-            siteid2 = gerar_siteid(
-                cidade_par[1], cidade_par[0], "RTED", 
-                site_contadores[cidade_par[1]+cidade_par[0]]["RTED"] + 1,
-                ABREVIACOES
+            yield criar_elemento(
+                registro.nome(f"RTED-{cidade_par[1]}{i+1:02d}-02"), "EDGE", 5,
+                proximo_siteid(cidade_par, "RTED"), cidade_par, "RTED", regiao
             )
-            site_contadores[cidade_par[1]+cidade_par[0]]["RTED"] += 1
-            
-            elementos.append({
-                "elemento": f"RTED-{cidade_par[1]}{i+1:02d}-02",
-                "camada": "EDGE",
-                "nivel": 5,
-                "cor": "",
-                "siteid": siteid2,
-                "apelido": "",
-                "cidade": cidade_par[0],
-                "uf": cidade_par[1],
-                "lat": cidade_par[2],
-                "lon": cidade_par[3],
-                "tipo": "RTED"
-            })
-            rted2 = elementos[-1]
-            
-            rted_pares.append((rted1, rted2))
     
-    # 5. Gerar SWACs (distribuição regional proporcional)
-    for regiao, qtd_regiao in dist_regional.items():
-        qtd_swac_regiao = round(dist_real["SWAC"] * (qtd_regiao / total_elementos))
+    # 6. SWACs: só nome e coordenadas ficam guardados, agrupados por cidade
+    def bloco_swac(regiao, qtd_swac_regiao, rng, inicio):
         cidades_regiao = cidades_por_regiao[regiao]
         
         if not cidades_regiao:
-            continue
+            return
             
         for i in range(qtd_swac_regiao):
-            cidade = random.choice(cidades_regiao)
-            siteid = gerar_siteid(
-                cidade[1], cidade[0], "SWAC", 
-                site_contadores[cidade[1]+cidade[0]]["SWAC"] + 1,
-                ABREVIACOES
+            cidade = sortear_cidade(rng, regiao)
+            verificar = not swacs.transbordou
+            yield criar_elemento(
+                registro.nome(f"SWAC-{cidade[1]}{i+1:02d}-01", verificar), "METRO", 8,
+                registro.siteid(cidade[1], cidade[0], "SWAC", verificar), cidade, "SWAC", regiao
+            )
+    
+    blocos_camada = {
+        "RTIC": bloco_rtic,
+        "RTRR": bloco_rtrr,
+        "RTPR": bloco_rtpr,
+        "RTED": bloco_rted,
+        "SWAC": bloco_swac
+    }
+    rted_pendente = []
+    
+    def incluir(elem):
+        tipo = elem["tipo"]
+        if tipo == "RTIC":
+            rtics.append(elem)
+        elif tipo == "RTRR":
+            rtrrs.append(elem)
+        elif tipo == "RTPR":
+            rtprs.append(elem)
+        elif tipo == "RTED":
+            rted_pendente.append(elem)
+            if len(rted_pendente) == 2:
+                rted_pares.append(tuple(rted_pendente))
+                rted_pendente.clear()
+        else:
+            swacs.adicionar(
+                elem["regiao"], f"{elem['uf']}-{elem['cidade']}",
+                (elem["elemento"], elem["lat"], elem["lon"])
+            )
+    
+    # Abreviações repetidas entre camadas dividem os contadores de siteid:
+    # esses blocos não são independentes e sempre são refeitos
+    abreviacoes = list(ABREVIACOES.values())
+    blocos_anteriores = (anterior or {}).get("blocos") or {}
+    
+    def assinatura(camada, regiao, qtd, inicio):
+        if abreviacoes.count(ABREVIACOES[camada]) > 1:
+            return None
+        return (
+            semente, qtd, inicio, largura_contador, ABREVIACOES[camada],
+            cidades_por_regiao[regiao], pesos_regiao.get(regiao),
+            REGIOES_HIERARQUIA[regiao] if camada in ("RTIC", "RTRR") else None,
+            nomes_ptt if camada in ("RTIC", "RTRR", "RTPR") else None
+        )
+    
+    for camada, gerar_bloco in blocos_camada.items():
+        for regiao, qtd in dist_regional[camada].items():
+            inicio = len(rtics) if camada == "RTIC" else len(rtrrs) if camada == "RTRR" else 0
+            if blocos is None:
+                rng = random.Random(f"{semente}:{camada}:{regiao}")
+                for elem in gerar_bloco(regiao, qtd, rng, inicio):
+                    incluir(elem)
+                    yield elem
+                continue
+            
+            chave = (camada, regiao)
+            entradas = assinatura(camada, regiao, qtd, inicio)
+            bloco_anterior = blocos_anteriores.get(chave)
+            if entradas is not None and bloco_anterior is not None and bloco_anterior[0] == entradas:
+                elementos = bloco_anterior[1]
+                for elem in elementos:
+                    registro.reservar(elem["elemento"], elem["siteid"])
+                    incluir(elem)
+                    yield elem
+            else:
+                elementos = []
+                rng = random.Random(f"{semente}:{camada}:{regiao}")
+                for elem in gerar_bloco(regiao, qtd, rng, inicio):
+                    incluir(elem)
+                    elementos.append(elem)
+                    yield elem
+                estado["regenerados"].append(chave)
+            blocos[chave] = (entradas, elementos)
+    
+    estado["completo"] = True
+
+class IndiceConexoes:
+    """Índice somente leitura dos RTICs e pares de RTED usado pelas conexões.
+    
+    Montado uma vez por geração (e uma vez por processo, na montagem
+    paralela): grades espaciais dos RTICs e das coordenadas dos RTEDs, e os
+    RTICs mais próximos de cada coordenada já consultada.
+    """
+    
+    def __init__(self, rtics, rted_pares):
+        self.rtics = rtics
+        self.rted_pares = rted_pares
+        self.rtics_por_regiao = defaultdict(list)
+        for rtic in rtics:
+            self.rtics_por_regiao[rtic["regiao"]].append(rtic)
+        self.rtics_por_distancia = {}
+        self.indice_rtic = IndiceEspacial([(r["lat"], r["lon"]) for r in rtics])
+        
+        # Menor índice de par RTED com algum membro em cada coordenada
+        self.par_por_coordenada = {}
+        for indice, par in enumerate(rted_pares):
+            for rted in par:
+                self.par_por_coordenada.setdefault((rted["lat"], rted["lon"]), indice)
+        self.coordenadas_rted = list(self.par_por_coordenada)
+        self.indice_rted = IndiceEspacial(self.coordenadas_rted)
+    
+    def rtics_proximos(self, lat, lon):
+        """Os 2 RTICs mais próximos, calculados uma vez por coordenada (cidade).
+        
+        Empates seguem a ordem da lista de RTICs, como em sorted().
+        """
+        ordenados = self.rtics_por_distancia.get((lat, lon))
+        if ordenados is None:
+            ordenados = [self.rtics[j] for _, j in self.indice_rtic.proximos(lat, lon, 2)]
+            self.rtics_por_distancia[(lat, lon)] = ordenados
+        return ordenados
+    
+    def par_rted_mais_proximo(self, lat, lon):
+        """Par de RTEDs mais próximo; empates vão para o par de menor índice, como no min()"""
+        # Amplia a busca enquanto as coordenadas encontradas estiverem empatadas
+        k = 4
+        while True:
+            proximos = self.indice_rted.proximos(lat, lon, k)
+            distancia = proximos[0][0]
+            empatados = [j for d, j in proximos if d == distancia]
+            if len(empatados) < len(proximos) or len(proximos) < k:
+                break
+            k *= 4
+        return self.rted_pares[min(self.par_por_coordenada[self.coordenadas_rted[j]] for j in empatados)]
+
+# Famílias de conexões montadas região a região, na ordem de saída
+FAMILIAS_REGIONAIS = ("RTRR", "RTPR", "RTED", "SWAC")
+
+def conexoes_regiao(indice, familia, dados):
+    """Conexões de uma família para os elementos de uma região, como tuplas
+    (ponta-a, ponta-b, texto, tipo) para criar_conexao.
+    
+    'dados' traz os RTRRs, RTPRs, pares de RTED e SWACs (por cidade) da
+    região e a semente dos anéis metro. Cada anel é embaralhado por um
+    gerador próprio derivado da semente e da cidade, então o resultado não
+    depende de qual processo monta a região nem em que ordem.
+    """
+    if familia == "RTRR":
+        # Conexões RTRR para RTICs (2 conexões por RTRR)
+        for rtrr in dados["rtrrs"]:
+            rtics_regiao = indice.rtics_por_regiao.get(rtrr["regiao"], [])
+            if len(rtics_regiao) < 2:
+                # Se não houver 2 RTICs na região, pegar os mais próximos
+                rtics_ordenados = indice.rtics_proximos(rtrr["lat"], rtrr["lon"])[:2]
+            else:
+                rtics_ordenados = rtics_regiao[:2]
+            
+            for rtic in rtics_ordenados:
+                yield (
+                    rtrr["elemento"], rtic["elemento"],
+                    "Reflector Link", "REFLECTOR_LINK"
+                )
+    
+    elif familia == "RTPR":
+        # Conexões RTPR para RTICs (2 mais próximos)
+        for rtpr in dados["rtprs"]:
+            for rtic in indice.rtics_proximos(rtpr["lat"], rtpr["lon"])[:2]:
+                yield (
+                    rtpr["elemento"], rtic["elemento"],
+                    "Peering Link", "PEERING_LINK"
+                )
+    
+    elif familia == "RTED":
+        # Conexões RTED (pares e para RTICs)
+        for par in dados["rted_pares"]:
+            yield (par[0]["elemento"], par[1]["elemento"], "Edge Pair", "EDGE_PAIR")
+            
+            # Primeiro RTIC (mais próximo) para o primeiro elemento do par
+            rtic1 = indice.rtics_proximos(par[0]["lat"], par[0]["lon"])[0]
+            yield (
+                par[0]["elemento"], rtic1["elemento"],
+                "Edge to Core", "EDGE_TO_CORE"
+            )
+            
+            # RTIC diferente (o mais próximo) para o segundo elemento do par;
+            # caso só tenha um RTIC (impossível, mas seguro), repete o primeiro
+            rtic2 = next(
+                (r for r in indice.rtics_proximos(par[1]["lat"], par[1]["lon"]) if r is not rtic1),
+                rtic1
             )
-            site_contadores[cidade[1]+cidade[0]]["SWAC"] += 1
+            yield (
+                par[1]["elemento"], rtic2["elemento"],
+                "Edge to Core", "EDGE_TO_CORE"
+            )
+    
+    elif familia == "SWAC":
+        # Conexões SWAC (anéis conectados a pares de RTED)
+        for chave, swacs in dados["swacs"]:
+            # Ordenar aleatoriamente para formar anel
+            cidade_swacs = list(swacs)
+            random.Random(f"{dados['semente']}:{chave}").shuffle(cidade_swacs)
+            
+            for i in range(len(cidade_swacs)):
+                prox = (i + 1) % len(cidade_swacs)
+                yield (
+                    cidade_swacs[i][0], cidade_swacs[prox][0],
+                    "Metro Ring", "METRO_RING"
+                )
             
-            elementos.append({
-                "elemento": f"SWAC-{cidade[1]}{i+1:02d}-01",
-                "camada": "METRO",
-                "nivel": 8,
-                "cor": "",
-                "siteid": siteid,
-                "apelido": "",
-                "cidade": cidade[0],
-                "uf": cidade[1],
-                "lat": cidade[2],
-                "lon": cidade[3],
-                "tipo": "SWAC"
-            })
-            swacs.append(elementos[-1])
-    
-    # ========================================================================
-    # RESTANTE DO CÓDIGO (CONEXÕES E SAÍDA) PERMANECE IGUAL
-    # ========================================================================
-    
-    # Gerar conexões
-    conexoes = []
+            # Conectar extremidades ao par de RTEDs mais próximo
+            if len(cidade_swacs) > 0 and indice.rted_pares:
+                par_rted = indice.par_rted_mais_proximo(cidade_swacs[0][1], cidade_swacs[0][2])
+                yield (
+                    cidade_swacs[0][0], par_rted[0]["elemento"],
+                    "Metro to Edge", "METRO_TO_EDGE"
+                )
+                yield (
+                    cidade_swacs[-1][0], par_rted[1]["elemento"],
+                    "Metro to Edge", "METRO_TO_EDGE"
+                )
+
+# Índice de conexões do processo de montagem (preenchido pelo inicializador)
+_indice_conexoes = []
+
+def _inicializar_conexoes(rtics, rted_pares):
+    """Monta o índice de RTICs/RTEDs no processo de montagem de conexões"""
+    _indice_conexoes[:] = [IndiceConexoes(rtics, rted_pares)]
+
+def _montar_conexoes_regiao(dados):
+    """Todas as famílias regionais de uma região, como listas de tuplas (uma por família)"""
+    return [list(conexoes_regiao(_indice_conexoes[0], familia, dados)) for familia in FAMILIAS_REGIONAIS]
+
+def iter_conexoes(config, total_elementos=None, seed=None, estado=None, processos=None, anterior=None):
+    """Gera as conexões da topologia sob demanda.
+    
+    Usa o 'estado' preenchido por um iter_elementos já consumido; sem ele,
+    os elementos são gerados (e descartados) a partir de total_elementos e seed.
+    Com 'processos' > 1, as famílias regionais (RTRR, RTPR, RTED e SWAC) são
+    montadas por região em um pool de processos; a saída é a mesma da
+    montagem serial.
+    
+    Se o estado guarda blocos (iter_elementos com 'anterior'), as famílias
+    regionais também ficam em 'blocos_conexoes' e, com o estado 'anterior',
+    uma família é reaproveitada quando o bloco de elementos da região e os
+    elementos de que ela depende (RTICs de todas as regiões; para SWAC,
+    também os pares de RTED) não mudaram. A montagem, nesse caso, é serial.
+    """
+    if estado is None or not estado.get("completo"):
+        estado = {}
+        for _ in iter_elementos(config, total_elementos, seed, estado):
+            pass
+    
+    rtics = estado["rtics"]
+    rted_pares = estado["rted_pares"]
     
     # Agrupar RTICs por região
     rtics_por_regiao = defaultdict(list)
     for rtic in rtics:
-        regiao = obter_regiao(rtic["uf"], REGIOES)
-        rtics_por_regiao[regiao].append(rtic)
+        rtics_por_regiao[rtic["regiao"]].append(rtic)
 
     # 1. Criar anéis regionais
     for regiao, rtics_regiao in rtics_por_regiao.items():
@@ -741,16 +1131,10 @@ Edite config.json:
             
         for i in range(n):
             j = (i+1) % n
-            conexoes.append({
-                "ponta-a": rtics_regiao[i]["elemento"],
-                "ponta-b": rtics_regiao[j]["elemento"],
-                "textoconexao": f"Core Ring {regiao}",
-                "strokeWidth": "",
-                "strokeColor": "",
-                "dashed": "",
-                "fontStyle": "",
-                "fontSize": ""
-            })
+            yield criar_conexao(
+                rtics_regiao[i]["elemento"], rtics_regiao[j]["elemento"],
+                f"Core Ring {regiao}", "CORE_RING"
+            )
 
     # 2. Ordem estratégica das regiões (geográfica)
     ordem_regioes = ["Norte", "Nordeste", "Centro-Oeste", "Sudeste", "Sul"]
@@ -764,16 +1148,10 @@ Edite config.json:
     if n_nacional >= 2:
         for i in range(n_nacional):
             j = (i+1) % n_nacional
-            conexoes.append({
-                "ponta-a": hubs_principais[i]["elemento"],
-                "ponta-b": hubs_principais[j]["elemento"],
-                "textoconexao": "National Ring",
-                "strokeWidth": "",
-                "strokeColor": "",
-                "dashed": "",
-                "fontStyle": "",
-                "fontSize": ""
-            })
+            yield criar_conexao(
+                hubs_principais[i]["elemento"], hubs_principais[j]["elemento"],
+                "National Ring", "NATIONAL_RING"
+            )
 
     # 4. Conexões de redundância entre regiões
     for i in range(len(ordem_regioes)):
@@ -782,321 +1160,2165 @@ Edite config.json:
         
         if (len(rtics_por_regiao.get(regiao_atual, [])) >= 2 and 
            rtics_por_regiao.get(regiao_vizinha)):
-            
-            segundo_hub = rtics_por_regiao[regiao_atual][1]
-            hub_vizinho = rtics_por_regiao[regiao_vizinha][0]
-            
-            conexoes.append({
-                "ponta-a": segundo_hub["elemento"],
-                "ponta-b": hub_vizinho["elemento"],
-                "textoconexao": "Cross-Region Redundancy",
-                "strokeWidth": "",
-                "strokeColor": "",
-                "dashed": "",
-                "fontStyle": "",
-                "fontSize": ""
-            })
-    
-    # Conexões RTRR para RTICs (2 conexões por RTRR)
-    for rtrr in rtrrs:
-        # Encontrar RTICs na mesma região
-        regiao_rtrr = obter_regiao(rtrr["uf"], REGIOES)
-        rtics_regiao = [r for r in rtics if obter_regiao(r["uf"], REGIOES) == regiao_rtrr]
-        if len(rtics_regiao) < 2:
-            # Se não houver 2 RTICs na região, pegar os mais próximos
-            rtics_ordenados = sorted(
-                rtics,
-                key=lambda r: distancia_geografica(
-                    rtrr["lat"], rtrr["lon"], r["lat"], r["lon"]
-                )
-            )[:2]
-        else:
-            rtics_ordenados = rtics_regiao[:2]
-        
-        for rtic in rtics_ordenados:
-            conexoes.append({
-                "ponta-a": rtrr["elemento"],
-                "ponta-b": rtic["elemento"],
-                "textoconexao": "Reflector Link",
-                "strokeWidth": "",
-                "strokeColor": "",
-                "dashed": "",
-                "fontStyle": "",
-                "fontSize": ""
-            })
-    
-    # Conexões RTPR para RTICs (2 conexões por RTPR)
-    for rtpr in rtprs:
-        # Encontrar os 2 RTICs mais próximos
-        rtics_ordenados = sorted(
-            rtics,
-            key=lambda r: distancia_geografica(
-                rtpr["lat"], rtpr["lon"], r["lat"], r["lon"]
+            yield criar_conexao(
+                rtics_por_regiao[regiao_atual][1]["elemento"],
+                rtics_por_regiao[regiao_vizinha][0]["elemento"],
+                "Cross-Region Redundancy", "CROSS_REGION"
             )
-        )[:2]
-        
-        for rtic in rtics_ordenados:
-            conexoes.append({
-                "ponta-a": rtpr["elemento"],
-                "ponta-b": rtic["elemento"],
-                "textoconexao": "Peering Link",
-                "strokeWidth": "",
-                "strokeColor": "",
-                "dashed": "",
-                "fontStyle": "",
-                "fontSize": ""
-            })
-    
-    # Conexões RTED (pares e para RTICs)
-    for par in rted_pares:
-        # Conexão entre o par
-        conexoes.append({
-            "ponta-a": par[0]["elemento"],
-            "ponta-b": par[1]["elemento"],
-            "textoconexao": "Edge Pair",
-            "strokeWidth": "",
-            "strokeColor": "",
-            "dashed": "",
-            "fontStyle": "",
-            "fontSize": ""
+    
+    # 5. Famílias regionais, montadas por região (em processos, se pedido)
+    # e emitidas família a família, na ordem das regiões
+    indice = IndiceConexoes(rtics, rted_pares)
+    regioes = list(estado["dist_regional"]["SWAC"])
+    dados_regioes = [{
+        "rtrrs": [e for e in estado["rtrrs"] if e["regiao"] == regiao],
+        "rtprs": [e for e in estado["rtprs"] if e["regiao"] == regiao],
+        "rted_pares": [p for p in rted_pares if p[0]["regiao"] == regiao],
+        "swacs": estado["swacs"].regiao(regiao),
+        "semente": estado["semente"]
+    } for regiao in regioes]
+    
+    blocos = estado.get("blocos")
+    if blocos is not None:
+        # Entradas de cada família: o próprio bloco e os RTICs/RTEDs gerados
+        blocos_anteriores = (anterior or {}).get("blocos_conexoes") or {}
+        blocos_conexoes = estado["blocos_conexoes"] = {}
+        rtics_gerados = tuple((e["elemento"], e["lat"], e["lon"], e["regiao"]) for e in rtics)
+        # As coordenadas das duas pontas entram no índice de pares mais próximos
+        rteds_gerados = tuple(
+            (a["elemento"], a["lat"], a["lon"], b["elemento"], b["lat"], b["lon"])
+            for a, b in rted_pares
+        )
+        for familia in FAMILIAS_REGIONAIS:
+            for regiao, dados in zip(regioes, dados_regioes):
+                chave = (familia, regiao)
+                entradas = (
+                    blocos.get(chave, (None,))[0], rtics_gerados,
+                    rteds_gerados if familia == "SWAC" else None
+                )
+                bloco_anterior = blocos_anteriores.get(chave)
+                if (entradas[0] is not None and bloco_anterior is not None
+                        and bloco_anterior[0] == entradas):
+                    conexoes = bloco_anterior[1]
+                else:
+                    conexoes = list(conexoes_regiao(indice, familia, dados))
+                    estado["regenerados"].append(("conexoes " + familia, regiao))
+                blocos_conexoes[chave] = (entradas, conexoes)
+                for conexao in conexoes:
+                    yield criar_conexao(*conexao)
+        return
+    
+    # Com SWACs em disco a montagem é serial, lendo uma cidade por vez
+    if processos is None or processos <= 1 or len(dados_regioes) <= 1 or estado["swacs"].transbordou:
+        for familia in FAMILIAS_REGIONAIS:
+            for dados in dados_regioes:
+                for conexao in conexoes_regiao(indice, familia, dados):
+                    yield criar_conexao(*conexao)
+        return
+    
+    import concurrent.futures
+    
+    for dados in dados_regioes:
+        dados["swacs"] = list(dados["swacs"])
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(processos, len(dados_regioes)),
+        initializer=_inicializar_conexoes,
+        initargs=(rtics, rted_pares)
+    ) as pool:
+        resultados = list(pool.map(_montar_conexoes_regiao, dados_regioes))
+    for f in range(len(FAMILIAS_REGIONAIS)):
+        for resultado in resultados:
+            for conexao in resultado[f]:
+                yield criar_conexao(*conexao)
+
+class Exportador:
+    """Consumidor de elementos e conexões (base para as saídas da topologia)"""
+    
+    def escrever_elemento(self, elem):
+        pass
+    
+    def escrever_conexao(self, conn):
+        pass
+    
+    def fechar(self):
+        pass
+
+class SaidaCSV(Exportador):
+    """Escreve elementos.csv, conexoes.csv e localidades.csv em uma única passada"""
+    
+    def __init__(self, pasta_saida):
+        self.arquivos = []
+        self.elementos = self._abrir(pasta_saida, "elementos.csv", CAMPOS_ELEMENTOS)
+        self.conexoes = self._abrir(pasta_saida, "conexoes.csv", CAMPOS_CONEXOES)
+        self.localidades = self._abrir(pasta_saida, "localidades.csv", CAMPOS_LOCALIDADES)
+    
+    def _abrir(self, pasta_saida, nome, campos):
+        f = open(os.path.join(pasta_saida, nome), "w", newline="", encoding="utf-8")
+        self.arquivos.append(f)
+        writer = csv.DictWriter(f, fieldnames=campos, delimiter=";")
+        writer.writeheader()
+        return writer
+    
+    def escrever_elemento(self, elem):
+        # Aplicar remoção de acentos em todos os campos textuais
+        self.elementos.writerow({
+            "elemento": remover_acentos(elem["elemento"]),
+            "camada": remover_acentos(elem["camada"]),
+            "nivel": elem["nivel"],
+            "cor": remover_acentos(elem["cor"]),
+            "siteid": remover_acentos(elem["siteid"]),
+            "apelido": remover_acentos(elem["apelido"])
+        })
+        self.localidades.writerow({
+            "siteid": remover_acentos(elem["siteid"]),
+            "Localidade": remover_acentos(elem["cidade"]),
+            "RegiaoGeografica": remover_acentos(elem["regiao"]),
+            "Latitude": decimal_to_dms(elem["lat"], "lat"),
+            "Longitude": decimal_to_dms(elem["lon"], "lon")
         })
+    
+    def escrever_conexao(self, conn):
+        self.conexoes.writerow({campo: remover_acentos(conn[campo]) for campo in CAMPOS_CONEXOES})
+    
+    def fechar(self):
+        for f in self.arquivos:
+            f.close()
+
+# Propriedades tipadas dos elementos nos formatos de grafo: (campo, tipo GraphML, tipo Neo4j)
+PROPRIEDADES_GRAFO = [
+    ("camada", "string", "string"),
+    ("nivel", "int", "int"),
+    ("siteid", "string", "string"),
+    ("tipo", "string", "string"),
+    ("cidade", "string", "string"),
+    ("uf", "string", "string"),
+    ("regiao", "string", "string"),
+    ("lat", "double", "double"),
+    ("lon", "double", "double")
+]
+
+class SaidaGraphML(Exportador):
+    """Escreve topologia.graphml em fluxo (nós e arestas conforme são gerados)"""
+    
+    def __init__(self, pasta_saida):
+        from xml.sax.saxutils import escape, quoteattr
         
-        # Encontrar dois RTICs diferentes para o par
-        rtics_ordenados1 = sorted(
-            rtics,
-            key=lambda r: distancia_geografica(
-                par[0]["lat"], par[0]["lon"], r["lat"], r["lon"]
+        self.escape = escape
+        self.quoteattr = quoteattr
+        self.f = open(os.path.join(pasta_saida, "topologia.graphml"), "w", encoding="utf-8")
+        self.f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<graphml xmlns="http://graphml.graphdrawing.org/xmlns"'
+            ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+            ' xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns'
+            ' http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n'
+        )
+        for campo, tipo_graphml, _ in PROPRIEDADES_GRAFO:
+            self.f.write(
+                f'  <key id="{campo}" for="node" attr.name="{campo}" attr.type="{tipo_graphml}"/>\n'
             )
+        self.f.write('  <key id="textoconexao" for="edge" attr.name="textoconexao" attr.type="string"/>\n')
+        self.f.write('  <key id="tipoconexao" for="edge" attr.name="tipo" attr.type="string"/>\n')
+        self.f.write('  <graph id="topologia" edgedefault="undirected">\n')
+        self.total_conexoes = 0
+    
+    def escrever_elemento(self, elem):
+        escape = self.escape
+        dados = "".join(
+            f'<data key="{campo}">{escape(str(elem[campo]))}</data>'
+            for campo, _, _ in PROPRIEDADES_GRAFO
+        )
+        self.f.write(f'    <node id={self.quoteattr(remover_acentos(elem["elemento"]))}>{dados}</node>\n')
+    
+    def escrever_conexao(self, conn):
+        escape, quoteattr = self.escape, self.quoteattr
+        self.total_conexoes += 1
+        self.f.write(
+            f'    <edge id="e{self.total_conexoes}"'
+            f' source={quoteattr(remover_acentos(conn["ponta-a"]))}'
+            f' target={quoteattr(remover_acentos(conn["ponta-b"]))}>'
+            f'<data key="textoconexao">{escape(conn["textoconexao"])}</data>'
+            f'<data key="tipoconexao">{conn["tipo"]}</data></edge>\n'
+        )
+    
+    def fechar(self):
+        self.f.write('  </graph>\n</graphml>\n')
+        self.f.close()
+
+class SaidaNeo4j(Exportador):
+    """Escreve CSVs de nós e relacionamentos compatíveis com 'neo4j-admin database import'"""
+    
+    def __init__(self, pasta_saida):
+        self.f_nos = open(os.path.join(pasta_saida, "neo4j_elementos.csv"), "w", newline="", encoding="utf-8")
+        self.f_rel = open(os.path.join(pasta_saida, "neo4j_conexoes.csv"), "w", newline="", encoding="utf-8")
+        self.nos = csv.writer(self.f_nos)
+        self.rel = csv.writer(self.f_rel)
+        self.nos.writerow(
+            ["elemento:ID(Elemento)"]
+            + [f"{campo}:{tipo_neo4j}" for campo, _, tipo_neo4j in PROPRIEDADES_GRAFO]
+            + [":LABEL"]
+        )
+        self.rel.writerow([":START_ID(Elemento)", ":END_ID(Elemento)", ":TYPE", "textoconexao:string"])
+    
+    def escrever_elemento(self, elem):
+        self.nos.writerow(
+            [remover_acentos(elem["elemento"])]
+            + [elem[campo] for campo, _, _ in PROPRIEDADES_GRAFO]
+            + [f"Elemento;{elem['tipo']}"]
         )
+    
+    def escrever_conexao(self, conn):
+        self.rel.writerow([
+            remover_acentos(conn["ponta-a"]),
+            remover_acentos(conn["ponta-b"]),
+            conn["tipo"],
+            conn["textoconexao"]
+        ])
+    
+    def fechar(self):
+        self.f_nos.close()
+        self.f_rel.close()
+
+# Supernets padrão do plano de endereçamento (sobrescritas por ENDERECAMENTO no config.json)
+ENDERECAMENTO_PADRAO = {
+    "LOOPBACK_V4": "10.0.0.0/12",
+    "PONTO_A_PONTO_V4": "10.64.0.0/10",
+    "LOOPBACK_V6": "fd00:0:0:1::/64",
+    "PONTO_A_PONTO_V6": "fd00:0:0:2::/64",
+    "BITS_BLOCO": 8
+}
+
+def formatar_ipv4(valor):
+    """Formata um inteiro de 32 bits como endereço IPv4"""
+    return f"{(valor >> 24) & 255}.{(valor >> 16) & 255}.{(valor >> 8) & 255}.{valor & 255}"
+
+def formatar_ipv6(valor):
+    """Formata um inteiro de 128 bits como endereço IPv6 (forma comprimida)"""
+    grupos = [(valor >> deslocamento) & 0xFFFF for deslocamento in range(112, -1, -16)]
+    
+    # Maior sequência de grupos zerados (mínimo 2) vira '::'
+    melhor_inicio, melhor_tam = -1, 1
+    inicio = None
+    for i, grupo in enumerate(grupos + [1]):
+        if grupo == 0 and inicio is None:
+            inicio = i
+        elif grupo != 0 and inicio is not None:
+            if i - inicio > melhor_tam:
+                melhor_inicio, melhor_tam = inicio, i - inicio
+            inicio = None
+    
+    if melhor_inicio < 0:
+        return ":".join(f"{g:x}" for g in grupos)
+    esquerda = ":".join(f"{g:x}" for g in grupos[:melhor_inicio])
+    direita = ":".join(f"{g:x}" for g in grupos[melhor_inicio + melhor_tam:])
+    return f"{esquerda}::{direita}"
+
+class PoolEnderecos:
+    """Aloca endereços de uma supernet em blocos alinhados por grupo (camada/tipo e região).
+    
+    Cada grupo recebe blocos de 2^bits_bloco endereços sob demanda, então os
+    endereços de um mesmo grupo ficam contíguos e sumarizáveis, e a alocação
+    depende só da ordem dos registros (determinística para a mesma semente).
+    Usa apenas aritmética inteira: nenhum objeto ipaddress por endereço.
+    """
+    
+    def __init__(self, supernet, tamanho_prefixo, bits_bloco):
+        import ipaddress
         
-        # Primeiro RTIC para o primeiro elemento do par
-        rtic1 = rtics_ordenados1[0]
-        conexoes.append({
-            "ponta-a": par[0]["elemento"],
-            "ponta-b": rtic1["elemento"],
-            "textoconexao": "Edge to Core",
-            "strokeWidth": "",
-            "strokeColor": "",
-            "dashed": "",
-            "fontStyle": "",
-            "fontSize": ""
-        })
+        rede = ipaddress.ip_network(supernet, strict=True)
+        self.versao = rede.version
+        self.formatar = formatar_ipv4 if rede.version == 4 else formatar_ipv6
+        self.supernet = supernet
+        self.base = int(rede.network_address)
+        self.limite = rede.num_addresses
+        self.tamanho_prefixo = tamanho_prefixo
+        # Cada alocação ocupa 2^(bits da família - prefixo) endereços
+        self.passo = 1 << (rede.max_prefixlen - tamanho_prefixo)
+        self.bloco = max(1 << bits_bloco, self.passo)
+        self.proximo_bloco = 0
+        self.grupos = {}
+    
+    def alocar(self, grupo):
+        """Retorna o endereço inicial (inteiro) da próxima alocação do grupo"""
+        cursor = self.grupos.get(grupo)
+        if cursor is None or cursor[0] + self.passo > cursor[1]:
+            if self.proximo_bloco + self.bloco > self.limite:
+                raise ValueError(f"supernet {self.supernet} esgotada; aumente o prefixo em ENDERECAMENTO")
+            cursor = [self.proximo_bloco, self.proximo_bloco + self.bloco]
+            self.proximo_bloco += self.bloco
+            self.grupos[grupo] = cursor
+        endereco = cursor[0]
+        cursor[0] += self.passo
+        return self.base + endereco
+
+class AlocadorEnderecos:
+    """Plano de endereçamento: loopback por elemento e /31 (ou /127) por conexão"""
+    
+    def __init__(self, config):
+        plano = dict(ENDERECAMENTO_PADRAO)
+        plano.update(config.get("ENDERECAMENTO", {}))
+        bits_bloco = plano["BITS_BLOCO"]
         
-        # Encontrar RTIC diferente para o segundo elemento do par
-        rtics_ordenados2 = sorted(
-            [r for r in rtics if r != rtic1],
-            key=lambda r: distancia_geografica(
-                par[1]["lat"], par[1]["lon"], r["lat"], r["lon"]
+        self.loopbacks = []
+        self.pontos = []
+        for familia in ("V4", "V6"):
+            if plano.get(f"LOOPBACK_{familia}"):
+                self.loopbacks.append(PoolEnderecos(
+                    plano[f"LOOPBACK_{familia}"], 32 if familia == "V4" else 128, bits_bloco
+                ))
+            if plano.get(f"PONTO_A_PONTO_{familia}"):
+                self.pontos.append(PoolEnderecos(
+                    plano[f"PONTO_A_PONTO_{familia}"], 31 if familia == "V4" else 127, bits_bloco
+                ))
+        self.regiao_elemento = {}
+    
+    def loopback(self, elem):
+        """Lista de (endereço, prefixo) da loopback do elemento, uma por família"""
+        self.regiao_elemento[elem["elemento"]] = elem["regiao"]
+        grupo = (elem["tipo"], elem["regiao"])
+        enderecos = []
+        for pool in self.loopbacks:
+            valor = pool.alocar(grupo)
+            # Evitar o endereço de rede no início de cada bloco
+            if (valor - pool.base) % pool.bloco == 0:
+                valor = pool.alocar(grupo)
+            enderecos.append((pool.formatar(valor), pool.tamanho_prefixo))
+        return enderecos
+    
+    def ponto_a_ponto(self, conn):
+        """Lista de (endereço ponta-a, endereço ponta-b, prefixo) da conexão, uma por família"""
+        grupo = (conn["tipo"], self.regiao_elemento.get(conn["ponta-a"], ""))
+        enderecos = []
+        for pool in self.pontos:
+            valor = pool.alocar(grupo)
+            enderecos.append((pool.formatar(valor), pool.formatar(valor + 1), pool.tamanho_prefixo))
+        return enderecos
+
+class SaidaEnderecamento(Exportador):
+    """Escreve enderecamento.csv (loopbacks e redes ponto a ponto) em uma única passada"""
+    
+    def __init__(self, pasta_saida, config):
+        self.alocador = AlocadorEnderecos(config)
+        self.f = open(os.path.join(pasta_saida, "enderecamento.csv"), "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.f, delimiter=";")
+        self.writer.writerow(["elemento", "recurso", "endereco", "prefixo", "vizinho"])
+    
+    def escrever_elemento(self, elem):
+        # PTTs são externos à rede, não recebem endereços
+        if elem["tipo"] == "PTT":
+            return
+        nome = remover_acentos(elem["elemento"])
+        for endereco, prefixo in self.alocador.loopback(elem):
+            self.writer.writerow([nome, "loopback", endereco, prefixo, ""])
+    
+    def escrever_conexao(self, conn):
+        ponta_a = remover_acentos(conn["ponta-a"])
+        ponta_b = remover_acentos(conn["ponta-b"])
+        for endereco_a, endereco_b, prefixo in self.alocador.ponto_a_ponto(conn):
+            self.writer.writerow([ponta_a, conn["tipo"], endereco_a, prefixo, ponta_b])
+            self.writer.writerow([ponta_b, conn["tipo"], endereco_b, prefixo, ponta_a])
+    
+    def fechar(self):
+        self.f.close()
+
+# Templates padrão de configuração por camada (string.Template; sobrescritos por
+# TEMPLATES_CONFIG no config.json com caminhos de arquivos por camada)
+TEMPLATES_CONFIG_PADRAO = {
+    "interface": """interface ${interface}
+ description ${vizinho} | ${textoconexao}
+${enderecos}
+ no shutdown
+!
+""",
+    "RTIC": """! ${elemento} - ${camada} - ${cidade}/${uf} (${regiao}) - siteid ${siteid}
+hostname ${elemento}
+!
+interface Loopback0
+${loopback}
+!
+${interfaces}router isis CORE
+ is-type level-2-only
+ metric-style wide
+!
+router bgp 65000
+ bgp router-id ${router_id}
+ neighbor RR peer-group
+ neighbor RR remote-as 65000
+ neighbor RR update-source Loopback0
+!
+end
+""",
+    "RTRR": """! ${elemento} - ${camada} - ${cidade}/${uf} (${regiao}) - siteid ${siteid}
+hostname ${elemento}
+!
+interface Loopback0
+${loopback}
+!
+${interfaces}router isis CORE
+ is-type level-2-only
+ metric-style wide
+!
+router bgp 65000
+ bgp router-id ${router_id}
+ bgp cluster-id ${router_id}
+ neighbor CLIENTES peer-group
+ neighbor CLIENTES remote-as 65000
+ neighbor CLIENTES route-reflector-client
+ neighbor CLIENTES update-source Loopback0
+!
+end
+""",
+    "RTPR": """! ${elemento} - ${camada} - ${cidade}/${uf} (${regiao}) - siteid ${siteid}
+hostname ${elemento}
+!
+interface Loopback0
+${loopback}
+!
+${interfaces}router isis CORE
+ is-type level-2-only
+ metric-style wide
+!
+router bgp 65000
+ bgp router-id ${router_id}
+ neighbor RR peer-group
+ neighbor RR remote-as 65000
+ neighbor RR update-source Loopback0
+ neighbor IXP peer-group
+ neighbor IXP description Peering PTT
+!
+end
+""",
+    "RTED": """! ${elemento} - ${camada} - ${cidade}/${uf} (${regiao}) - siteid ${siteid}
+hostname ${elemento}
+!
+interface Loopback0
+${loopback}
+!
+${interfaces}router isis CORE
+ is-type level-1-2
+ metric-style wide
+!
+router bgp 65000
+ bgp router-id ${router_id}
+ neighbor RR peer-group
+ neighbor RR remote-as 65000
+ neighbor RR update-source Loopback0
+!
+end
+""",
+    "SWAC": """! ${elemento} - ${camada} - ${cidade}/${uf} (${regiao}) - siteid ${siteid}
+hostname ${elemento}
+!
+interface Loopback0
+${loopback}
+!
+${interfaces}router isis METRO
+ is-type level-1
+ metric-style wide
+!
+end
+"""
+}
+
+# Prefixo dos nomes de interface por camada (numeradas na ordem das conexões)
+INTERFACES_CAMADA = {
+    "RTIC": "HundredGigE0/0/0/",
+    "RTRR": "TenGigE0/0/0/",
+    "RTPR": "HundredGigE0/0/0/",
+    "RTED": "HundredGigE0/0/0/",
+    "SWAC": "TenGigabitEthernet1/0/"
+}
+
+def carregar_templates(config):
+    """Textos dos templates por camada, com substituições de TEMPLATES_CONFIG"""
+    templates = dict(TEMPLATES_CONFIG_PADRAO)
+    for chave, caminho in config.get("TEMPLATES_CONFIG", {}).items():
+        with open(caminho, "r", encoding="utf-8") as f:
+            templates[chave] = f.read()
+    return templates
+
+def linhas_endereco(endereco, prefixo):
+    """Linhas de configuração de um endereço IPv4 ou IPv6"""
+    if ":" in endereco:
+        return f" ipv6 address {endereco}/{prefixo}"
+    mascara = formatar_ipv4((0xFFFFFFFF << (32 - prefixo)) & 0xFFFFFFFF)
+    return f" ip address {endereco} {mascara}"
+
+# Templates compilados uma vez por processo (inicializador do pool)
+_templates_compilados = {}
+
+def _inicializar_renderizacao(templates):
+    """Compila os templates no processo de renderização"""
+    import string
+    
+    _templates_compilados.clear()
+    for chave, texto in templates.items():
+        _templates_compilados[chave] = string.Template(texto)
+
+def _renderizar_lote(pasta_configs, lote):
+    """Renderiza e grava um lote de dispositivos; retorna a quantidade gravada"""
+    template_interface = _templates_compilados["interface"]
+    for dispositivo in lote:
+        prefixo = INTERFACES_CAMADA.get(dispositivo["tipo"], "Ethernet")
+        interfaces = "".join(
+            template_interface.safe_substitute(
+                interface=f"{prefixo}{i}",
+                vizinho=vizinho,
+                textoconexao=textoconexao,
+                enderecos=enderecos
             )
+            for i, (vizinho, textoconexao, enderecos) in enumerate(dispositivo["interfaces"])
         )
+        texto = _templates_compilados[dispositivo["tipo"]].safe_substitute(dispositivo, interfaces=interfaces)
+        nome_arquivo = dispositivo["elemento"].replace(" ", "_").replace("/", "_")
+        with open(os.path.join(pasta_configs, f"{nome_arquivo}.cfg"), "w", encoding="utf-8") as f:
+            f.write(texto)
+    return len(lote)
+
+class SaidaConfigs(Exportador):
+    """Renderiza uma configuração por dispositivo em configs/, em paralelo.
+    
+    Durante a passada monta o índice de vizinhos (interfaces numeradas na
+    ordem das conexões, com endereços do plano de endereçamento); ao fechar
+    distribui lotes de dispositivos para um pool de processos.
+    """
+    
+    TAMANHO_LOTE = 500
+    
+    def __init__(self, pasta_saida, config, processos=None):
+        self.pasta_configs = os.path.join(pasta_saida, "configs")
+        os.makedirs(self.pasta_configs, exist_ok=True)
+        self.templates = carregar_templates(config)
+        self.alocador = AlocadorEnderecos(config)
+        self.processos = processos or os.cpu_count() or 1
+        self.dispositivos = {}
+        self.total_renderizados = 0
+    
+    def escrever_elemento(self, elem):
+        if elem["tipo"] not in self.templates:
+            return
+        loopbacks = self.alocador.loopback(elem)
+        nome = remover_acentos(elem["elemento"])
+        self.dispositivos[elem["elemento"]] = {
+            "elemento": nome,
+            "tipo": elem["tipo"],
+            "camada": elem["camada"],
+            "siteid": remover_acentos(elem["siteid"]),
+            "cidade": remover_acentos(elem["cidade"]),
+            "uf": elem["uf"],
+            "regiao": remover_acentos(elem["regiao"]),
+            "router_id": loopbacks[0][0] if loopbacks else "",
+            "loopback": "\n".join(linhas_endereco(e, p) for e, p in loopbacks),
+            "interfaces": []
+        }
+    
+    def escrever_conexao(self, conn):
+        enderecos = self.alocador.ponto_a_ponto(conn)
+        pontas = ((conn["ponta-a"], conn["ponta-b"], 0), (conn["ponta-b"], conn["ponta-a"], 1))
+        for local, remoto, lado in pontas:
+            dispositivo = self.dispositivos.get(local)
+            if dispositivo is None:
+                continue
+            dispositivo["interfaces"].append((
+                remover_acentos(remoto),
+                remover_acentos(conn["textoconexao"]),
+                "\n".join(linhas_endereco(e[lado], e[2]) for e in enderecos)
+            ))
+    
+    def fechar(self):
+        dispositivos = list(self.dispositivos.values())
+        self.dispositivos = {}
+        lotes = [
+            dispositivos[i:i + self.TAMANHO_LOTE]
+            for i in range(0, len(dispositivos), self.TAMANHO_LOTE)
+        ]
         
-        if rtics_ordenados2:
-            rtic2 = rtics_ordenados2[0]
-        else:
-            # Caso só tenha um RTIC (impossível, mas seguro)
-            rtic2 = rtics_ordenados1[0]
+        if self.processos <= 1 or len(lotes) <= 1:
+            _inicializar_renderizacao(self.templates)
+            for lote in lotes:
+                self.total_renderizados += _renderizar_lote(self.pasta_configs, lote)
+            return
         
-        conexoes.append({
-            "ponta-a": par[1]["elemento"],
-            "ponta-b": rtic2["elemento"],
-            "textoconexao": "Edge to Core",
-            "strokeWidth": "",
-            "strokeColor": "",
-            "dashed": "",
-            "fontStyle": "",
-            "fontSize": ""
-        })
+        import concurrent.futures
+        
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(self.processos, len(lotes)),
+            initializer=_inicializar_renderizacao,
+            initargs=(self.templates,)
+        ) as pool:
+            for qtd in pool.map(_renderizar_lote, [self.pasta_configs] * len(lotes), lotes):
+                self.total_renderizados += qtd
+
+# Raio máximo (km) de deslocamento em relação à posição geográfica, por nível da camada:
+# o núcleo fica praticamente no mapa, as camadas de acesso se espalham ao redor da cidade
+RAIO_LAYOUT_NIVEL = {1: 20.0, 3: 30.0, 4: 30.0, 5: 60.0, 8: 300.0, 10: 20.0}
+
+def construir_quadtree(xs, ys, capacidade_folha=8):
+    """Quadtree em listas planas para Barnes–Hut.
     
-    # Conexões SWAC (anéis conectados a pares de RTED)
-    swacs_por_cidade = defaultdict(list)
-    for swac in swacs:
-        chave = f"{swac['uf']}-{swac['cidade']}"
-        swacs_por_cidade[chave].append(swac)
+    Retorna (cx, cy, massa, lado, filhos, pontos): centro de massa, quantidade
+    de nós e lado de cada célula; 'filhos' tem os índices das subcélulas e
+    'pontos' os nós de cada folha (None nas células internas).
+    """
+    cx, cy, massa, lado, filhos, pontos = [], [], [], [], [], []
+    x0, y0 = min(xs), min(ys)
+    tamanho = max(max(xs) - x0, max(ys) - y0, 1e-6)
     
-    for cidade_swacs in swacs_por_cidade.values():
-        # Ordenar aleatoriamente para formar anel
-        random.shuffle(cidade_swacs)
+    pilha = [(list(range(len(xs))), x0, y0, tamanho, None)]
+    while pilha:
+        indices, bx, by, bl, pai = pilha.pop()
+        celula = len(cx)
+        if pai is not None:
+            filhos[pai].append(celula)
+        qtd = len(indices)
+        cx.append(sum(xs[i] for i in indices) / qtd)
+        cy.append(sum(ys[i] for i in indices) / qtd)
+        massa.append(qtd)
+        lado.append(bl)
+        filhos.append([])
         
-        # Conectar em anel
-        for i in range(len(cidade_swacs)):
-            prox = (i + 1) % len(cidade_swacs)
-            conexoes.append({
-                "ponta-a": cidade_swacs[i]["elemento"],
-                "ponta-b": cidade_swacs[prox]["elemento"],
-                "textoconexao": "Metro Ring",
-                "strokeWidth": "",
-                "strokeColor": "",
-                "dashed": "",
-                "fontStyle": "",
-                "fontSize": ""
-            })
+        if qtd <= capacidade_folha or bl < 1e-3:
+            pontos.append(indices)
+            continue
+        pontos.append(None)
         
-        # Conectar extremidades a um par de RTEDs
-        if len(cidade_swacs) > 0 and rted_pares:
-            # Encontrar par de RTED mais próximo
-            cidade_ref = (cidade_swacs[0]["lat"], cidade_swacs[0]["lon"])
-            par_rted = min(
-                rted_pares,
-                key=lambda p: min(
-                    distancia_geografica(cidade_ref[0], cidade_ref[1], p[0]["lat"], p[0]["lon"]),
-                    distancia_geografica(cidade_ref[0], cidade_ref[1], p[1]["lat"], p[1]["lon"])
-                )
-            )
+        meio = bl / 2
+        mx, my = bx + meio, by + meio
+        quadrantes = ([], [], [], [])
+        for i in indices:
+            quadrantes[(xs[i] >= mx) + 2 * (ys[i] >= my)].append(i)
+        for q, sub in enumerate(quadrantes):
+            if sub:
+                pilha.append((sub, bx + meio * (q & 1), by + meio * (q >> 1), meio, celula))
+    
+    return cx, cy, massa, lado, filhos, pontos
+
+def layout_forcas(xs0, ys0, niveis, adjacencia, iteracoes=20, comprimento=10.0, theta=1.0):
+    """Refina posições geográficas (km) com um layout de forças Barnes–Hut.
+    
+    Repulsão entre todos os nós aproximada pela quadtree (O(n log n) por
+    iteração), atração ao longo das conexões e uma mola até a posição
+    geográfica; o deslocamento de cada nó é limitado por RAIO_LAYOUT_NIVEL
+    conforme o nível da camada. Determinístico: não usa números aleatórios.
+    """
+    n = len(xs0)
+    if n == 0:
+        return [], []
+    
+    # Nós no mesmo ponto (ex: SWACs de uma cidade) partem de uma espiral
+    xs, ys = list(xs0), list(ys0)
+    ocupacao = defaultdict(int)
+    angulo_dourado = math.pi * (3 - math.sqrt(5))
+    for i in range(n):
+        k = ocupacao[(xs0[i], ys0[i])]
+        ocupacao[(xs0[i], ys0[i])] = k + 1
+        if k:
+            raio = 0.5 * comprimento * math.sqrt(k)
+            xs[i] += raio * math.cos(k * angulo_dourado)
+            ys[i] += raio * math.sin(k * angulo_dourado)
+    del ocupacao
+    
+    raios = [RAIO_LAYOUT_NIVEL.get(nivel, comprimento) for nivel in niveis]
+    k2 = comprimento * comprimento
+    theta2 = theta * theta
+    ancora = 1.0 / comprimento
+    temperatura_inicial = comprimento * 5
+    
+    for iteracao in range(iteracoes):
+        temperatura = temperatura_inicial * (1 - iteracao / iteracoes) + comprimento * 0.1
+        cx, cy, massa, lado, filhos, pontos = construir_quadtree(xs, ys)
+        novos_x, novos_y = xs[:], ys[:]
+        
+        for i in range(n):
+            x, y = xs[i], ys[i]
+            fx = fy = 0.0
             
-            # Conectar primeira e última SWAC ao par de RTED
-            conexoes.append({
-                "ponta-a": cidade_swacs[0]["elemento"],
-                "ponta-b": par_rted[0]["elemento"],
-                "textoconexao": "Metro to Edge",
-                "strokeWidth": "",
-                "strokeColor": "",
-                "dashed": "",
-                "fontStyle": "",
-                "fontSize": ""
-            })
+            # Repulsão (k²/d) via Barnes–Hut
+            pilha = [0]
+            while pilha:
+                c = pilha.pop()
+                dx = x - cx[c]
+                dy = y - cy[c]
+                d2 = dx * dx + dy * dy
+                folha = pontos[c]
+                if folha is not None:
+                    for j in folha:
+                        if j != i:
+                            dx = x - xs[j]
+                            dy = y - ys[j]
+                            d2 = dx * dx + dy * dy or 1e-6
+                            fx += dx * k2 / d2
+                            fy += dy * k2 / d2
+                elif lado[c] * lado[c] < theta2 * d2:
+                    fx += dx * k2 * massa[c] / d2
+                    fy += dy * k2 * massa[c] / d2
+                else:
+                    pilha.extend(filhos[c])
             
-            conexoes.append({
-                "ponta-a": cidade_swacs[-1]["elemento"],
-                "ponta-b": par_rted[1]["elemento"],
-                "textoconexao": "Metro to Edge",
-                "strokeWidth": "",
-                "strokeColor": "",
-                "dashed": "",
-                "fontStyle": "",
-                "fontSize": ""
-            })
-    
-    # Criar pasta de saída
-    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    pasta_saida = f"TOPOLOGIA_{args.e}_{timestamp}"
-    os.makedirs(pasta_saida, exist_ok=True)
+            # Atração (d²/k) ao longo das conexões
+            for j in adjacencia[i]:
+                dx = xs[j] - x
+                dy = ys[j] - y
+                d = math.sqrt(dx * dx + dy * dy)
+                fx += dx * d / comprimento
+                fy += dy * d / comprimento
+            
+            # Mola até a posição geográfica
+            fx += (xs0[i] - x) * ancora * k2
+            fy += (ys0[i] - y) * ancora * k2
+            
+            # Passo limitado pela temperatura e pelo raio do nível
+            f = math.sqrt(fx * fx + fy * fy)
+            if f > 0:
+                passo = min(f, temperatura) / f
+                x += fx * passo
+                y += fy * passo
+            dx = x - xs0[i]
+            dy = y - ys0[i]
+            d = math.sqrt(dx * dx + dy * dy)
+            if d > raios[i]:
+                x = xs0[i] + dx * raios[i] / d
+                y = ys0[i] + dy * raios[i] / d
+            novos_x[i] = x
+            novos_y[i] = y
+        
+        xs, ys = novos_x, novos_y
     
-    # Escrever elementos.csv
-    with open(f"{pasta_saida}/elementos.csv", "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f, 
-            fieldnames=["elemento", "camada", "nivel", "cor", "siteid", "apelido"],
-            delimiter=";"
-        )
-        writer.writeheader()
-        for elem in elementos:
-            # Aplicar remoção de acentos em todos os campos textuais
-            writer.writerow({
-                "elemento": remover_acentos(elem["elemento"]),
-                "camada": remover_acentos(elem["camada"]),
-                "nivel": elem["nivel"],
-                "cor": remover_acentos(elem["cor"]),
-                "siteid": remover_acentos(elem["siteid"]),
-                "apelido": remover_acentos(elem["apelido"])
-            })
-    
-    # Escrever conexoes.csv
-    with open(f"{pasta_saida}/conexoes.csv", "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f, 
-            fieldnames=["ponta-a", "ponta-b", "textoconexao", 
-                       "strokeWidth", "strokeColor", "dashed", 
-                       "fontStyle", "fontSize"],
-            delimiter=";"
-        )
-        writer.writeheader()
-        for conn in conexoes:
-            # Aplicar remoção de acentos em todos os campos textuais
-            writer.writerow({
-                "ponta-a": remover_acentos(conn["ponta-a"]),
-                "ponta-b": remover_acentos(conn["ponta-b"]),
-                "textoconexao": remover_acentos(conn["textoconexao"]),
-                "strokeWidth": remover_acentos(conn["strokeWidth"]),
-                "strokeColor": remover_acentos(conn["strokeColor"]),
-                "dashed": remover_acentos(conn["dashed"]),
-                "fontStyle": remover_acentos(conn["fontStyle"]),
-                "fontSize": remover_acentos(conn["fontSize"])
-            })
-    
-    # Escrever localidades.csv
-    with open(f"{pasta_saida}/localidades.csv", "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f, 
-            fieldnames=["siteid", "Localidade", "RegiaoGeografica", "Latitude", "Longitude"],
-            delimiter=";"
+    return xs, ys
+
+class SaidaLayout(Exportador):
+    """Calcula coordenadas de visualização refinadas e escreve layout.csv"""
+    
+    # Projeção equiretangular (km) centrada na latitude média do Brasil
+    KM_POR_GRAU = 111.32
+    
+    def __init__(self, pasta_saida, iteracoes=20):
+        self.caminho = os.path.join(pasta_saida, "layout.csv")
+        self.iteracoes = iteracoes
+        self.fator_lon = self.KM_POR_GRAU * math.cos(math.radians(-15))
+        self.indice = {}
+        self.xs = []
+        self.ys = []
+        self.niveis = []
+        self.adjacencia = []
+    
+    def escrever_elemento(self, elem):
+        self.indice[elem["elemento"]] = len(self.xs)
+        self.xs.append(elem["lon"] * self.fator_lon)
+        # y cresce para baixo nos visualizadores: norte no topo
+        self.ys.append(-elem["lat"] * self.KM_POR_GRAU)
+        self.niveis.append(elem["nivel"])
+        self.adjacencia.append([])
+    
+    def escrever_conexao(self, conn):
+        a = self.indice[conn["ponta-a"]]
+        b = self.indice[conn["ponta-b"]]
+        if a != b:
+            self.adjacencia[a].append(b)
+            self.adjacencia[b].append(a)
+    
+    def fechar(self):
+        xs, ys = layout_forcas(self.xs, self.ys, self.niveis, self.adjacencia, self.iteracoes)
+        with open(self.caminho, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(["elemento", "x", "y"])
+            for nome, i in self.indice.items():
+                writer.writerow([remover_acentos(nome), f"{xs[i]:.1f}", f"{ys[i]:.1f}"])
+
+# Nó do containerlab por camada: kind, imagem, nome das interfaces ({n} = porta),
+# primeira porta de dados e recursos estimados por nó (sobrescritos por CONTAINERLAB no config.json)
+CONTAINERLAB_PADRAO = {
+    "RTIC": {"kind": "cisco_xrd", "image": "ios-xr/xrd-control-plane:7.11.1",
+             "interface": "Gi0-0-0-{n}", "primeira_porta": 0, "cpu": 2.0, "memoria_mb": 2048},
+    "RTRR": {"kind": "cisco_xrd", "image": "ios-xr/xrd-control-plane:7.11.1",
+             "interface": "Gi0-0-0-{n}", "primeira_porta": 0, "cpu": 1.0, "memoria_mb": 2048},
+    "RTPR": {"kind": "cisco_xrd", "image": "ios-xr/xrd-control-plane:7.11.1",
+             "interface": "Gi0-0-0-{n}", "primeira_porta": 0, "cpu": 1.0, "memoria_mb": 2048},
+    "RTED": {"kind": "cisco_xrd", "image": "ios-xr/xrd-control-plane:7.11.1",
+             "interface": "Gi0-0-0-{n}", "primeira_porta": 0, "cpu": 1.0, "memoria_mb": 2048},
+    "SWAC": {"kind": "linux", "image": "quay.io/frrouting/frr:9.1.0",
+             "interface": "eth{n}", "primeira_porta": 1, "cpu": 0.25, "memoria_mb": 128},
+    "PTT": {"kind": "linux", "image": "quay.io/frrouting/frr:9.1.0",
+            "interface": "eth{n}", "primeira_porta": 1, "cpu": 0.5, "memoria_mb": 256}
+}
+
+def nome_no_lab(nome):
+    """Nome de nó aceito pelo containerlab (letras, dígitos, '.', '_' e '-')"""
+    return "".join(c if c.isalnum() or c in "._-" else "-" for c in remover_acentos(nome))
+
+def yaml_texto(valor):
+    """String YAML entre aspas duplas (a sintaxe de string JSON também é YAML válido)"""
+    return json.dumps(valor, ensure_ascii=False)
+
+class SaidaContainerlab(Exportador):
+    """Escreve topologia.clab.yml (containerlab) em fluxo e estima os recursos por camada.
+    
+    Os nós saem conforme os elementos são gerados e os links conforme as
+    conexões; cada ponta recebe a próxima porta do seu elemento, na ordem de
+    conexoes.csv. O YAML é escrito à mão (ver yaml_texto). Ao fechar, grava
+    containerlab_recursos.csv com nós, vCPUs e memória por camada.
+    
+    O nome do laboratório não depende da pasta de saída, para que o
+    arquivo continue válido quando recuperado do cache em outra pasta.
+    """
+    
+    def __init__(self, pasta_saida, config, nome_lab):
+        self.nos = {}
+        for tipo, padrao in CONTAINERLAB_PADRAO.items():
+            self.nos[tipo] = dict(padrao, **config.get("CONTAINERLAB", {}).get(tipo, {}))
+        self.pasta_saida = pasta_saida
+        self.tipo_elemento = {}
+        self.portas = {}
+        self.por_camada = Counter()
+        self.links = 0
+        
+        self.f = open(os.path.join(pasta_saida, "topologia.clab.yml"), "w", encoding="utf-8")
+        self.f.write(f"name: {yaml_texto(nome_lab)}\n")
+        self.f.write("topology:\n  kinds:\n")
+        # Imagem de cada kind: a da primeira camada que o usa; as demais vão no nó
+        self.imagem_kind = {}
+        for no in self.nos.values():
+            self.imagem_kind.setdefault(no["kind"], no["image"])
+        for kind, imagem in self.imagem_kind.items():
+            self.f.write(f"    {kind}:\n      image: {yaml_texto(imagem)}\n")
+        self.f.write("  nodes:\n")
+    
+    def escrever_elemento(self, elem):
+        tipo = elem["tipo"] if elem["tipo"] in self.nos else "PTT"
+        no = self.nos[tipo]
+        nome = nome_no_lab(elem["elemento"])
+        self.tipo_elemento[nome] = tipo
+        self.por_camada[tipo] += 1
+        self.f.write(f"    {nome}:\n      kind: {no['kind']}\n")
+        if no["image"] != self.imagem_kind[no["kind"]]:
+            self.f.write(f"      image: {yaml_texto(no['image'])}\n")
+        self.f.write(
+            f"      labels: {{camada: {yaml_texto(elem['camada'])}, regiao: {yaml_texto(elem['regiao'])},"
+            f" cidade: {yaml_texto(elem['cidade'])}, uf: {yaml_texto(elem['uf'])},"
+            f" siteid: {yaml_texto(elem['siteid'])}}}\n"
         )
-        writer.writeheader()
-        for elem in elementos:
-            regiao = obter_regiao(elem["uf"], REGIOES)
-            # Aplicar remoção de acentos em todos os campos textuais
-            writer.writerow({
-                "siteid": remover_acentos(elem["siteid"]),
-                "Localidade": remover_acentos(elem["cidade"]),
-                "RegiaoGeografica": remover_acentos(regiao),
-                "Latitude": decimal_to_dms(elem["lat"], "lat"),
-                "Longitude": decimal_to_dms(elem["lon"], "lon")
-            })
     
-    # Gerar resumo - manter acentos pois é arquivo texto
-    resumo = f"""
-RESUMO DA TOPOLOGIA GERADA
-==========================
+    def _interface(self, nome):
+        no = self.nos[self.tipo_elemento.get(nome, "PTT")]
+        porta = self.portas.get(nome, no["primeira_porta"])
+        self.portas[nome] = porta + 1
+        return f"{nome}:{no['interface'].format(n=porta)}"
+    
+    def escrever_conexao(self, conn):
+        if self.links == 0:
+            self.f.write("  links:\n")
+        self.links += 1
+        ponta_a = self._interface(nome_no_lab(conn["ponta-a"]))
+        ponta_b = self._interface(nome_no_lab(conn["ponta-b"]))
+        self.f.write(f"    - endpoints: [{yaml_texto(ponta_a)}, {yaml_texto(ponta_b)}]\n")
+    
+    def recursos(self):
+        """[(camada, nós, vCPUs, memória em MB)] das camadas presentes"""
+        return [
+            (tipo, qtd, qtd * self.nos[tipo]["cpu"], qtd * self.nos[tipo]["memoria_mb"])
+            for tipo, qtd in self.por_camada.items()
+        ]
+    
+    def fechar(self):
+        if self.links == 0:
+            self.f.write("  links: []\n")
+        self.f.close()
+        
+        with open(os.path.join(self.pasta_saida, "containerlab_recursos.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(["camada", "kind", "nos", "vcpus", "memoria_mb"])
+            recursos = self.recursos()
+            for tipo, qtd, cpu, memoria in recursos:
+                writer.writerow([tipo, self.nos[tipo]["kind"], qtd, f"{cpu:g}", memoria])
+            writer.writerow([
+                "TOTAL", "", sum(r[1] for r in recursos),
+                f"{sum(r[2] for r in recursos):g}", sum(r[3] for r in recursos)
+            ])
 
-Data de geracao: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-Total de elementos: {args.e}
-Arquivo de configuração: {args.c}
+# Exportadores opcionais disponíveis na linha de comando (--exportar)
+EXPORTADORES = {
+    "graphml": (SaidaGraphML, ["topologia.graphml"]),
+    "neo4j": (SaidaNeo4j, ["neo4j_elementos.csv", "neo4j_conexoes.csv"])
+}
 
-DISTRIBUICAO POR CAMADA:
-------------------------
-INNER-CORE (RTIC): {dist_real["RTIC"]} elementos
-REFLECTOR (RTRR): {dist_real["RTRR"]} elementos
-PEERING (RTPR): {dist_real["RTPR"]} elementos
-EDGE (RTED): {dist_real["RTED"]} elementos
-METRO (SWAC): {dist_real["SWAC"]} elementos
+class Estatisticas(Exportador):
+    """Acumula as contagens usadas no resumo.txt"""
+    
+    def __init__(self):
+        self.total_elementos = 0
+        self.total_conexoes = 0
+        self.por_regiao = defaultdict(int)
+        self.por_uf = defaultdict(int)
+    
+    def escrever_elemento(self, elem):
+        self.total_elementos += 1
+        self.por_regiao[elem["regiao"]] += 1
+        self.por_uf[elem["uf"]] += 1
+    
+    def escrever_conexao(self, conn):
+        self.total_conexoes += 1
 
-DISTRIBUICAO GEOGRAFICA:
-------------------------
-Regioes:
-"""
+def rss_atual_kb():
+    """Memória residente atual do processo em KB (pico, fora do Linux; None se indisponível)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def pico_rss_kb():
+    """Pico de memória residente do processo em KB (None se indisponível)"""
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1])
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# Memória residente por elemento que fica em memória mesmo com os SWACs em
+# disco (RTIC, RTRR, RTPR, RTED e PTT: registro, nome e siteid no registro de
+# colisões, pares e índices das conexões); medida com 1 milhão de elementos
+BYTES_POR_ELEMENTO_RESIDENTE = 1400
+
+def memoria_minima_transbordo_kb(config, total_elementos):
+    """Estimativa da memória residente (KB) de uma geração com todos os SWACs em disco.
     
-    dist_regiao = defaultdict(int)
-    for elem in elementos:
-        regiao = obter_regiao(elem["uf"], REGIOES)
-        dist_regiao[regiao] += 1
+    Memória atual do processo mais BYTES_POR_ELEMENTO_RESIDENTE por elemento
+    das demais camadas: um --limiar-transbordo abaixo disso não tem como
+    ser respeitado.
+    """
+    dist_real = calcular_distribuicao(config, total_elementos)[0]
+    residentes = len(config["PTTS"]) + sum(q for camada, q in dist_real.items() if camada != "SWAC")
+    return (rss_atual_kb() or 0) + residentes * BYTES_POR_ELEMENTO_RESIDENTE // 1024
+
+class ProgressoJSON(Exportador):
+    """Eventos de progresso em JSON lines (um objeto por linha) para orquestradores.
     
-    for regiao, qtd in dist_regiao.items():
-        resumo += f"  {regiao}: {qtd} elementos\n"
+    Cada evento traz 'evento', 't' (segundos desde o início) e 'rss_kb'.
+    Fases são marcadas com inicio_fase/fim_fase; durante a geração, eventos
+    'progresso' com contagens por camada, região e tipo de conexão e os bytes
+    já gravados na pasta de saída saem no máximo a cada 'intervalo' segundos
+    (o relógio só é consultado a cada 256 registros). Sem destino, nada é
+    emitido. Deve ser o primeiro exportador, para que o fechamento dos
+    demais (layout, renderização de configs) conte como fase própria.
+    """
     
-    resumo += "\nEstados com mais elementos:\n"
-    dist_uf = defaultdict(int)
-    for elem in elementos:
-        dist_uf[elem["uf"]] += 1
+    def __init__(self, destino=None, pasta_saida=None, intervalo=0.5):
+        self.destino = destino
+        self.pasta_saida = pasta_saida
+        self.intervalo = intervalo
+        self.inicio = time.monotonic()
+        self.proximo = self.inicio + intervalo
+        self.fases = {}
+        self.registros = 0
+        self.por_camada = defaultdict(int)
+        self.por_regiao = defaultdict(int)
+        self.por_tipo_conexao = defaultdict(int)
     
-    for uf, qtd in sorted(dist_uf.items(), key=lambda x: x[1], reverse=True)[:5]:
-        resumo += f"  {uf}: {qtd} elementos\n"
+    def evento(self, tipo, **dados):
+        if self.destino is None:
+            return
+        agora = time.monotonic()
+        registro = {"evento": tipo, "t": round(agora - self.inicio, 3), "rss_kb": rss_atual_kb()}
+        registro.update(dados)
+        self.destino.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.destino.flush()
     
-    resumo += f"""
-CONEXÕES GERADAS:
------------------
-Total de conexões: {len(conexoes)}
-Tipos:
-  RTIC-RTIC: {len(rtics)*(len(rtics)-1)//2}
-  RTRR-RTIC: {len(rtrrs)*2}
-  RTPR-RTIC: {len(rtprs)*2}
-  RTED-RTED: {len(rted_pares)}
-  RTED-RTIC: {len(rted_pares)*2}
-  SWAC-SWAC: {sum(len(grupo) for grupo in swacs_por_cidade.values())}
-  SWAC-RTED: {len(swacs_por_cidade)*2}
+    def inicio_fase(self, fase):
+        self.fases[fase] = time.monotonic()
+        self.evento("fase_inicio", fase=fase)
+    
+    def fim_fase(self, fase, **dados):
+        inicio = self.fases.pop(fase, None)
+        if inicio is not None:
+            dados["duracao"] = round(time.monotonic() - inicio, 3)
+        self.evento("fase_fim", fase=fase, **dados)
+    
+    def bytes_gravados(self):
+        total = 0
+        for raiz, _, arquivos in os.walk(self.pasta_saida or "."):
+            for nome in arquivos:
+                try:
+                    total += os.path.getsize(os.path.join(raiz, nome))
+                except OSError:
+                    pass
+        return total
+    
+    def progresso(self):
+        self.evento(
+            "progresso",
+            elementos=sum(self.por_camada.values()),
+            conexoes=sum(self.por_tipo_conexao.values()),
+            por_camada=dict(self.por_camada),
+            por_regiao=dict(self.por_regiao),
+            por_tipo_conexao=dict(self.por_tipo_conexao),
+            bytes=self.bytes_gravados() if self.pasta_saida else None
+        )
+    
+    def _contar(self):
+        self.registros += 1
+        if self.registros & 255 == 0 and time.monotonic() >= self.proximo:
+            self.progresso()
+            self.proximo = time.monotonic() + self.intervalo
+    
+    def escrever_elemento(self, elem):
+        if self.destino is None:
+            return
+        if self.registros == 0:
+            self.inicio_fase("elementos")
+        self.por_camada[elem["camada"]] += 1
+        self.por_regiao[elem["regiao"]] += 1
+        self._contar()
+    
+    def escrever_conexao(self, conn):
+        if self.destino is None:
+            return
+        if not self.por_tipo_conexao:
+            self.fim_fase("elementos", elementos=sum(self.por_camada.values()))
+            self.inicio_fase("conexoes")
+        self.por_tipo_conexao[conn["tipo"]] += 1
+        self._contar()
+    
+    def fechar(self):
+        if self.destino is None:
+            return
+        self.progresso()
+        if "conexoes" in self.fases:
+            self.fim_fase("conexoes", conexoes=sum(self.por_tipo_conexao.values()))
+        self.inicio_fase("fechamento")
 
-ARQUIVOS GERADOS:
------------------
-1. elementos.csv: {len(elementos)} registros
-2. conexoes.csv: {len(conexoes)} registros
-3. localidades.csv: {len(elementos)} registros
+def exportar_topologia(config, total_elementos, seed, exportadores, processos=None,
+                       limiar_transbordo_mb=None, anterior=None):
+    """Gera a topologia em uma única passada, repassando cada registro aos exportadores.
+    
+    'processos' > 1 monta as conexões regionais em paralelo (ver iter_conexoes);
+    'limiar_transbordo_mb' manda os SWACs para disco (ver iter_elementos);
+    'anterior' guarda e reaproveita blocos entre gerações (ver iter_elementos).
+    """
+    estado = {}
+    try:
+        for elem in iter_elementos(config, total_elementos, seed, estado, limiar_transbordo_mb, anterior):
+            for exportador in exportadores:
+                exportador.escrever_elemento(elem)
+        for conn in iter_conexoes(config, estado=estado, processos=processos, anterior=anterior):
+            for exportador in exportadores:
+                exportador.escrever_conexao(conn)
+    finally:
+        for exportador in exportadores:
+            exportador.fechar()
+    return estado
 
-Pasta de saída: {pasta_saida}
-"""
+def particionar_grafo(ordem_geografica, adjacencia, k, tolerancia=0.03, max_passadas=20):
+    """Divide os nós em k partições balanceadas minimizando links entre partições.
     
-    with open(f"{pasta_saida}/resumo.txt", "w", encoding="utf-8") as f:
-        f.write(resumo)
+    Semeia as partições em fatias contíguas de 'ordem_geografica' (ids dos nós
+    ordenados por região/sub-região) e refina com propagação de rótulos: cada
+    nó migra para a partição onde tem mais vizinhos, respeitando os limites de
+    tamanho (n/k ± tolerância). Retorna a lista de partição por nó.
+    """
+    n = len(ordem_geografica)
+    particao = [0] * n
+    tamanhos = [0] * k
     
-    print(f"Topologia gerada com sucesso na pasta: {pasta_saida}")
-    print(resumo)
+    # Semente geográfica: fatias contíguas de tamanho n//k (ou +1)
+    base, resto = divmod(n, k)
+    inicio = 0
+    for p in range(k):
+        fim = inicio + base + (1 if p < resto else 0)
+        for no in ordem_geografica[inicio:fim]:
+            particao[no] = p
+        tamanhos[p] = fim - inicio
+        inicio = fim
+    
+    capacidade = math.ceil(n / k * (1 + tolerancia))
+    minimo = math.floor(n / k * (1 - tolerancia))
+    
+    # Refinamento por propagação de rótulos com restrição de balanceamento
+    for _ in range(max_passadas):
+        movimentos = 0
+        for no in range(n):
+            vizinhos = adjacencia[no]
+            if not vizinhos:
+                continue
+            atual = particao[no]
+            if tamanhos[atual] <= minimo:
+                continue
+            
+            contagem = defaultdict(int)
+            for vizinho in vizinhos:
+                contagem[particao[vizinho]] += 1
+            
+            melhor = atual
+            for p, qtd in sorted(contagem.items()):
+                if qtd > contagem[melhor] and tamanhos[p] < capacidade:
+                    melhor = p
+            
+            if melhor != atual:
+                particao[no] = melhor
+                tamanhos[atual] -= 1
+                tamanhos[melhor] += 1
+                movimentos += 1
+        if movimentos == 0:
+            break
+    
+    return particao
+
+def particionar_topologia(config, total_elementos, seed, k, pasta_saida):
+    """Divide a topologia em k partições (hosts) e grava os arquivos de cada uma.
+    
+    Primeira passada: monta o grafo compacto (ids inteiros) e particiona.
+    Segunda passada: regenera a topologia com a mesma semente e grava
+    hosts/host_NN/{elementos,conexoes,localidades}.csv e
+    hosts/links_entre_hosts.csv. Retorna (elementos por host, links cortados).
+    """
+    # Ordem geográfica: região e sub-região conforme REGIOES_HIERARQUIA
+    ordem_regioes = list(config["REGIOES_HIERARQUIA"])
+    sub_regiao_uf = {}
+    for dados in config["REGIOES_HIERARQUIA"].values():
+        for i, ufs in enumerate(dados["sub-regioes"].values()):
+            for uf in ufs:
+                sub_regiao_uf[uf] = i
+    
+    # 1ª passada: grafo compacto
+    indice = {}
+    chaves = []
+    estado = {}
+    for elem in iter_elementos(config, total_elementos, seed, estado):
+        indice[elem["elemento"]] = len(indice)
+        regiao = elem["regiao"]
+        chaves.append((
+            ordem_regioes.index(regiao) if regiao in ordem_regioes else len(ordem_regioes),
+            sub_regiao_uf.get(elem["uf"], 0),
+            elem["uf"]
+        ))
+    
+    adjacencia = [[] for _ in indice]
+    for conn in iter_conexoes(config, estado=estado):
+        a = indice[conn["ponta-a"]]
+        b = indice[conn["ponta-b"]]
+        if a != b:
+            adjacencia[a].append(b)
+            adjacencia[b].append(a)
+    
+    ordem_geografica = sorted(range(len(chaves)), key=chaves.__getitem__)
+    particao = particionar_grafo(ordem_geografica, adjacencia, k)
+    host_elemento = {nome: particao[i] for nome, i in indice.items()}
+    del indice, chaves, adjacencia, ordem_geografica, particao
+    
+    # 2ª passada: arquivos por host e lista de links entre hosts
+    pasta_hosts = os.path.join(pasta_saida, "hosts")
+    saidas = []
+    for p in range(k):
+        pasta_host = os.path.join(pasta_hosts, f"host_{p+1:02d}")
+        os.makedirs(pasta_host, exist_ok=True)
+        saidas.append(SaidaCSV(pasta_host))
+    
+    elementos_host = [0] * k
+    links_cortados = 0
+    with open(os.path.join(pasta_hosts, "links_entre_hosts.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(
+            f,
+            fieldnames=["ponta-a", "ponta-b", "textoconexao", "host-a", "host-b"],
+            delimiter=";"
+        )
+        writer.writeheader()
+        try:
+            estado = {}
+            for elem in iter_elementos(config, total_elementos, seed, estado):
+                p = host_elemento[elem["elemento"]]
+                saidas[p].escrever_elemento(elem)
+                elementos_host[p] += 1
+            for conn in iter_conexoes(config, estado=estado):
+                pa = host_elemento[conn["ponta-a"]]
+                pb = host_elemento[conn["ponta-b"]]
+                if pa == pb:
+                    saidas[pa].escrever_conexao(conn)
+                else:
+                    links_cortados += 1
+                    writer.writerow({
+                        "ponta-a": remover_acentos(conn["ponta-a"]),
+                        "ponta-b": remover_acentos(conn["ponta-b"]),
+                        "textoconexao": remover_acentos(conn["textoconexao"]),
+                        "host-a": f"host_{pa+1:02d}",
+                        "host-b": f"host_{pb+1:02d}"
+                    })
+        finally:
+            for saida in saidas:
+                saida.fechar()
+    
+    return elementos_host, links_cortados
+
+def carregar_topologia_gerada(pasta):
+    """Lê elementos/localidades/conexoes.csv de uma pasta gerada.
+    
+    Retorna ({elemento: (camada, região)}, Counter de conexões), com cada
+    conexão como par não ordenado (tupla ordenada) mais o texto da conexão.
+    """
+    elementos = {}
+    with open(os.path.join(pasta, "elementos.csv"), "r", newline="", encoding="utf-8") as f_elem, \
+         open(os.path.join(pasta, "localidades.csv"), "r", newline="", encoding="utf-8") as f_loc:
+        # localidades.csv tem uma linha por elemento, na mesma ordem
+        for elem, loc in zip(csv.DictReader(f_elem, delimiter=";"), csv.DictReader(f_loc, delimiter=";")):
+            elementos[elem["elemento"]] = (elem["camada"], loc["RegiaoGeografica"])
+    
+    conexoes = Counter()
+    with open(os.path.join(pasta, "conexoes.csv"), "r", newline="", encoding="utf-8") as f:
+        for conn in csv.DictReader(f, delimiter=";"):
+            a, b = conn["ponta-a"], conn["ponta-b"]
+            conexoes[(a, b, conn["textoconexao"]) if a <= b else (b, a, conn["textoconexao"])] += 1
+    return elementos, conexoes
+
+def comparar_topologias(pasta_a, pasta_b, limite_lista=20):
+    """Compara duas pastas geradas e retorna o relatório de diferenças"""
+    elementos_a, conexoes_a = carregar_topologia_gerada(pasta_a)
+    elementos_b, conexoes_b = carregar_topologia_gerada(pasta_b)
+    
+    adicionados = [nome for nome in elementos_b if nome not in elementos_a]
+    removidos = [nome for nome in elementos_a if nome not in elementos_b]
+    movidos = [
+        nome for nome, dados in elementos_b.items()
+        if nome in elementos_a and elementos_a[nome] != dados
+    ]
+    
+    conexoes_novas = conexoes_b - conexoes_a
+    conexoes_removidas = conexoes_a - conexoes_b
+    
+    # Religados: elementos presentes nas duas versões com algum vizinho diferente
+    religados = set()
+    for a, b, _ in list(conexoes_novas) + list(conexoes_removidas):
+        for nome in (a, b):
+            if nome in elementos_a and nome in elementos_b:
+                religados.add(nome)
+    
+    # Deltas por camada, região e tipo de conexão
+    por_camada = defaultdict(lambda: [0, 0])
+    por_regiao = defaultdict(lambda: [0, 0])
+    for lado, elementos in enumerate((elementos_a, elementos_b)):
+        for camada, regiao in elementos.values():
+            por_camada[camada][lado] += 1
+            por_regiao[regiao][lado] += 1
+    por_tipo = defaultdict(lambda: [0, 0])
+    for lado, conexoes in enumerate((conexoes_a, conexoes_b)):
+        for (_, _, texto), qtd in conexoes.items():
+            por_tipo[texto][lado] += qtd
+    
+    def listar(titulo, nomes):
+        texto = f"{titulo}: {len(nomes)}\n"
+        for nome in sorted(nomes)[:limite_lista]:
+            texto += f"  {nome}\n"
+        if len(nomes) > limite_lista:
+            texto += f"  ... e mais {len(nomes) - limite_lista}\n"
+        return texto
+    
+    def tabela(titulo, contagens):
+        texto = f"\n{titulo}:\n{'-' * (len(titulo) + 1)}\n"
+        for chave, (qtd_a, qtd_b) in sorted(contagens.items()):
+            if qtd_a != qtd_b:
+                texto += f"  {chave}: {qtd_a} -> {qtd_b} ({qtd_b - qtd_a:+d})\n"
+        if all(qtd_a == qtd_b for qtd_a, qtd_b in contagens.values()):
+            texto += "  sem diferenças\n"
+        return texto
+    
+    relatorio = f"""
+DIFERENÇAS ENTRE TOPOLOGIAS
+===========================
+A: {pasta_a} ({len(elementos_a)} elementos, {sum(conexoes_a.values())} conexões)
+B: {pasta_b} ({len(elementos_b)} elementos, {sum(conexoes_b.values())} conexões)
+
+"""
+    relatorio += listar("Elementos adicionados", adicionados)
+    relatorio += listar("Elementos removidos", removidos)
+    relatorio += listar("Elementos com camada/região alterada", movidos)
+    relatorio += listar("Elementos religados", religados)
+    relatorio += f"Conexões adicionadas: {sum(conexoes_novas.values())}\n"
+    relatorio += f"Conexões removidas: {sum(conexoes_removidas.values())}\n"
+    relatorio += tabela("POR CAMADA", por_camada)
+    relatorio += tabela("POR REGIAO", por_regiao)
+    relatorio += tabela("POR TIPO DE CONEXAO", por_tipo)
+    return relatorio
+
+# Pasta padrão do cache de topologias (--cache sem argumento)
+PASTA_CACHE_PADRAO = os.path.join(os.path.expanduser("~"), ".cache", "gerador_backbone")
+
+def chave_cache(config, total_elementos, seed, opcoes):
+    """Hash SHA-256 do config normalizado, quantidade, semente, opções de saída e VERSION"""
+    import hashlib
+    
+    conteudo = json.dumps(
+        {
+            "versao": VERSION,
+            "config": config,
+            "elementos": total_elementos,
+            "seed": seed,
+            "opcoes": opcoes
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+def vincular_arvore(origem, destino, ignorar=()):
+    """Replica uma pasta com hardlinks (cópia quando o hardlink não é possível)"""
+    import shutil
+    
+    for raiz, _, arquivos in os.walk(origem):
+        pasta = os.path.join(destino, os.path.relpath(raiz, origem))
+        os.makedirs(pasta, exist_ok=True)
+        for nome in arquivos:
+            if raiz == origem and nome in ignorar:
+                continue
+            try:
+                os.link(os.path.join(raiz, nome), os.path.join(pasta, nome))
+            except OSError:
+                shutil.copy2(os.path.join(raiz, nome), os.path.join(pasta, nome))
+
+def recuperar_do_cache(pasta_cache, chave, pasta_saida, cabecalho=None):
+    """Recria a pasta de saída a partir do cache; retorna o resumo ou None se não houver.
+    
+    'cabecalho' mapeia rótulos do resumo.txt (ex.: "Arquivo de configuração")
+    para os valores desta execução; "Pasta de saída" é sempre a atual.
+    """
+    entrada = os.path.join(pasta_cache, chave)
+    metadados = os.path.join(entrada, "entrada.json")
+    if not os.path.isfile(metadados):
+        return None
+    
+    vincular_arvore(os.path.join(entrada, "topologia"), pasta_saida, ignorar=("resumo.txt",))
+    
+    # O resumo é reescrito (não vinculado) com as entradas e a pasta desta execução
+    with open(os.path.join(entrada, "topologia", "resumo.txt"), "r", encoding="utf-8") as f:
+        resumo = f.read()
+    valores = dict(cabecalho or {}, **{"Pasta de saída": pasta_saida})
+    linhas = []
+    for linha in resumo.split("\n"):
+        rotulo = linha.split(":", 1)[0]
+        linhas.append(f"{rotulo}: {valores[rotulo]}" if rotulo in valores and ":" in linha else linha)
+    resumo = "\n".join(linhas)
+    with open(os.path.join(pasta_saida, "resumo.txt"), "w", encoding="utf-8") as f:
+        f.write(resumo)
+    
+    # Último acesso (LRU) é o mtime dos metadados
+    os.utime(metadados)
+    return resumo
+
+def armazenar_no_cache(pasta_cache, chave, pasta_saida, limite_bytes):
+    """Guarda uma cópia da pasta gerada no cache e aplica o limite de tamanho (LRU).
+    
+    Copiada, não vinculada: a pasta de saída pode ser regravada depois sem
+    alterar a entrada (as pastas recuperadas, essas sim, usam hardlinks).
+    """
+    import shutil
+    import tempfile
+    
+    entrada = os.path.join(pasta_cache, chave)
+    if os.path.isdir(entrada):
+        return
+    
+    # Montada em pasta temporária e renomeada: outro job nunca vê uma entrada pela metade
+    os.makedirs(pasta_cache, exist_ok=True)
+    temporaria = tempfile.mkdtemp(prefix=".tmp-", dir=pasta_cache)
+    shutil.copytree(pasta_saida, os.path.join(temporaria, "topologia"))
+    tamanho = sum(
+        os.path.getsize(os.path.join(raiz, nome))
+        for raiz, _, arquivos in os.walk(temporaria)
+        for nome in arquivos
+    )
+    with open(os.path.join(temporaria, "entrada.json"), "w", encoding="utf-8") as f:
+        json.dump({"versao": VERSION, "tamanho": tamanho, "origem": pasta_saida}, f)
+    try:
+        os.rename(temporaria, entrada)
+    except OSError:
+        # Outro job armazenou a mesma topologia antes
+        shutil.rmtree(temporaria, ignore_errors=True)
+    
+    limpar_cache(pasta_cache, limite_bytes)
+
+def limpar_cache(pasta_cache, limite_bytes):
+    """Remove as entradas menos usadas recentemente até caber no limite"""
+    import shutil
+    
+    entradas = []
+    for nome in os.listdir(pasta_cache):
+        metadados = os.path.join(pasta_cache, nome, "entrada.json")
+        try:
+            with open(metadados, "r", encoding="utf-8") as f:
+                tamanho = json.load(f)["tamanho"]
+            entradas.append((os.path.getmtime(metadados), tamanho, nome))
+        except (OSError, ValueError, KeyError):
+            continue
+    
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, nome in sorted(entradas):
+        if total <= limite_bytes:
+            break
+        shutil.rmtree(os.path.join(pasta_cache, nome), ignore_errors=True)
+        total -= tamanho
+
+# Códigos IBGE das UFs (bases de municípios costumam trazer só o código)
+CODIGOS_UF_IBGE = {
+    "11": "RO", "12": "AC", "13": "AM", "14": "RR", "15": "PA", "16": "AP", "17": "TO",
+    "21": "MA", "22": "PI", "23": "CE", "24": "RN", "25": "PB", "26": "PE", "27": "AL",
+    "28": "SE", "29": "BA", "31": "MG", "32": "ES", "33": "RJ", "35": "SP", "41": "PR",
+    "42": "SC", "43": "RS", "50": "MS", "51": "MT", "52": "GO", "53": "DF"
+}
+
+# Nomes aceitos para cada coluna do CSV de municípios
+COLUNAS_MUNICIPIOS = {
+    "nome": ("nome", "municipio", "nome_municipio"),
+    "uf": ("uf", "sigla_uf", "codigo_uf"),
+    "lat": ("lat", "latitude"),
+    "lon": ("lon", "longitude"),
+    "populacao": ("populacao", "pop", "habitantes")
+}
+
+def chave_nome(nome):
+    """Chave de comparação de nomes de cidade (sem acentos, maiúsculas)"""
+    return remover_acentos(nome).upper()
+
+def ler_municipios(caminho):
+    """Lê o CSV de municípios em fluxo.
+    
+    Retorna {uf: [(nome, chave do nome, lat, lon, população)]}. Aceita ',' ou
+    ';' como separador, UF como sigla ou código IBGE, e população opcional.
+    """
+    with open(caminho, "r", newline="", encoding="utf-8-sig") as f:
+        cabecalho = f.readline()
+        delimitador = ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+        campos = [
+            unicodedata.normalize('NFKD', campo.strip().lower()).encode('ASCII', 'ignore').decode('ASCII')
+            for campo in next(csv.reader([cabecalho], delimiter=delimitador))
+        ]
+        
+        colunas = {}
+        for coluna, nomes in COLUNAS_MUNICIPIOS.items():
+            indice = next((campos.index(nome) for nome in nomes if nome in campos), None)
+            if indice is None and coluna != "populacao":
+                raise ValueError(f"coluna '{coluna}' não encontrada em {caminho}")
+            colunas[coluna] = indice
+        i_nome, i_uf, i_lat, i_lon, i_pop = (
+            colunas["nome"], colunas["uf"], colunas["lat"], colunas["lon"], colunas["populacao"]
+        )
+        
+        municipios = defaultdict(list)
+        for linha in csv.reader(f, delimiter=delimitador):
+            if not linha:
+                continue
+            uf = linha[i_uf].strip().upper()
+            uf = CODIGOS_UF_IBGE.get(uf, uf)
+            nome = linha[i_nome].strip()
+            populacao = int(float(linha[i_pop])) if i_pop is not None and linha[i_pop].strip() else 0
+            municipios[uf].append((nome, chave_nome(nome), float(linha[i_lat]), float(linha[i_lon]), populacao))
+    return dict(municipios)
+
+def carregar_municipios(caminho, config, pasta_cache=PASTA_CACHE_PADRAO):
+    """CIDADES_UF a partir de um CSV de municípios, no lugar do config.json.
+    
+    O resultado da leitura fica em cache binário (pickle), invalidado pelo
+    tamanho/data do arquivo. Nomes que coincidem (sem acentos) com hubs e
+    PTTs do config passam a usar a grafia do config, para que continuem
+    sendo reconhecidos.
+    """
+    import hashlib
+    import pickle
+    
+    info = os.stat(caminho)
+    chave = hashlib.sha256(
+        f"{VERSION}|{os.path.abspath(caminho)}|{info.st_size}|{info.st_mtime_ns}".encode("utf-8")
+    ).hexdigest()
+    arquivo_cache = os.path.join(pasta_cache, "municipios", f"{chave}.pickle")
+    
+    try:
+        with open(arquivo_cache, "rb") as f:
+            municipios = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        municipios = ler_municipios(caminho)
+        try:
+            os.makedirs(os.path.dirname(arquivo_cache), exist_ok=True)
+            temporario = f"{arquivo_cache}.{os.getpid()}"
+            with open(temporario, "wb") as f:
+                pickle.dump(municipios, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, arquivo_cache)
+        except OSError:
+            pass
+    
+    grafias = {}
+    for dados in config["REGIOES_HIERARQUIA"].values():
+        for hub in dados["hubs"]:
+            grafias[chave_nome(hub)] = hub
+    for ptt in config["PTTS"]:
+        grafias[chave_nome(ptt[0])] = ptt[0]
+    
+    return {
+        uf: [(grafias.get(chave, nome), lat, lon, populacao) for nome, chave, lat, lon, populacao in cidades]
+        for uf, cidades in municipios.items()
+    }
+
+def gerar_pasta_topologia(args, config, seed, pasta_saida, progresso, anterior=None):
+    """Gera os arquivos pedidos na linha de comando e o resumo.txt na pasta.
+    
+    'anterior' segue para exportar_topologia (blocos reaproveitados no modo
+    --watch). Devolve (texto do resumo, estado da geração, estatísticas).
+    Erros de configuração saem como ValueError ou OSError, com a mensagem
+    pronta para o usuário.
+    """
+    estatisticas = Estatisticas()
+    exportadores = [SaidaCSV(pasta_saida), estatisticas]
+    if progresso.destino is not None:
+        exportadores.insert(0, progresso)
+    for formato in args.exportar:
+        exportadores.append(EXPORTADORES[formato][0](pasta_saida))
+    try:
+        if args.enderecamento:
+            exportadores.append(SaidaEnderecamento(pasta_saida, config))
+        if args.configs:
+            saida_configs = SaidaConfigs(pasta_saida, config, args.processos)
+            exportadores.append(saida_configs)
+        if args.layout:
+            exportadores.append(SaidaLayout(pasta_saida, args.layout_iteracoes))
+        if args.containerlab:
+            # Total e semente identificam a topologia; a pasta muda a cada execução
+            saida_containerlab = SaidaContainerlab(pasta_saida, config, f"backbone-{args.e}-s{seed}")
+            exportadores.append(saida_containerlab)
+    except ValueError as e:
+        raise ValueError(f"Plano de endereçamento inválido: {str(e)}") from e
+    except OSError as e:
+        raise OSError(f"Falha ao carregar template de configuração: {str(e)}") from e
+    progresso.inicio_fase("geracao")
+    estado = exportar_topologia(
+        config, args.e, seed, exportadores, args.processos, args.limiar_transbordo, anterior
+    )
+    progresso.fim_fase("fechamento")
+    progresso.fim_fase(
+        "geracao", elementos=estatisticas.total_elementos, conexoes=estatisticas.total_conexoes
+    )
+    dist_real = estado["dist_real"]
+    rtics = estado["rtics"]
+    rted_pares = estado["rted_pares"]
+    swacs = estado["swacs"]
+    
+    # Gerar resumo - manter acentos pois é arquivo texto
+    resumo = f"""
+RESUMO DA TOPOLOGIA GERADA
+==========================
+
+Data de geracao: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+Total de elementos: {args.e}
+Arquivo de configuração: {args.c}
+Arquivo de municípios: {args.m or "-"}
+Semente aleatória: {seed}
+
+DISTRIBUICAO POR CAMADA:
+------------------------
+PTT: {len(config["PTTS"])} elementos
+INNER-CORE (RTIC): {dist_real["RTIC"]} elementos
+REFLECTOR (RTRR): {dist_real["RTRR"]} elementos
+PEERING (RTPR): {dist_real["RTPR"]} elementos
+EDGE (RTED): {dist_real["RTED"]} elementos
+METRO (SWAC): {dist_real["SWAC"]} elementos
+
+DISTRIBUICAO GEOGRAFICA:
+------------------------
+Regioes:
+"""
+    
+    for regiao, qtd in estatisticas.por_regiao.items():
+        resumo += f"  {regiao}: {qtd} elementos\n"
+    
+    resumo += "\nEstados com mais elementos:\n"
+    for uf, qtd in sorted(estatisticas.por_uf.items(), key=lambda x: x[1], reverse=True)[:5]:
+        resumo += f"  {uf}: {qtd} elementos\n"
+    
+    resumo += f"""
+CONEXÕES GERADAS:
+-----------------
+Total de conexões: {estatisticas.total_conexoes}
+Tipos:
+  RTIC-RTIC: {len(rtics)*(len(rtics)-1)//2}
+  RTRR-RTIC: {len(estado["rtrrs"])*2}
+  RTPR-RTIC: {len(estado["rtprs"])*2}
+  RTED-RTED: {len(rted_pares)}
+  RTED-RTIC: {len(rted_pares)*2}
+  SWAC-SWAC: {swacs.total}
+  SWAC-RTED: {swacs.cidades*2}
+
+ARQUIVOS GERADOS:
+-----------------
+1. elementos.csv: {estatisticas.total_elementos} registros
+2. conexoes.csv: {estatisticas.total_conexoes} registros
+3. localidades.csv: {estatisticas.total_elementos} registros
+"""
+    arquivos_extras = [arquivo for formato in args.exportar for arquivo in EXPORTADORES[formato][1]]
+    if args.enderecamento:
+        arquivos_extras.append("enderecamento.csv")
+    if args.configs:
+        arquivos_extras.append(f"configs/: {saida_configs.total_renderizados} configurações")
+    if args.layout:
+        arquivos_extras.append("layout.csv")
+    if args.containerlab:
+        arquivos_extras.append("topologia.clab.yml")
+        arquivos_extras.append("containerlab_recursos.csv")
+    for numero, arquivo in enumerate(arquivos_extras, start=4):
+        resumo += f"{numero}. {arquivo}\n"
+    
+    if args.containerlab:
+        resumo += """
+RECURSOS ESTIMADOS (containerlab):
+----------------------------------
+"""
+        recursos = saida_containerlab.recursos()
+        for tipo, qtd, cpu, memoria in recursos:
+            resumo += f"  {tipo}: {qtd} nós, {cpu:g} vCPUs, {memoria / 1024:.1f} GB\n"
+        resumo += (
+            f"  Total: {sum(r[2] for r in recursos):g} vCPUs,"
+            f" {sum(r[3] for r in recursos) / 1024:.1f} GB\n"
+        )
+    if args.particoes:
+        progresso.inicio_fase("particionamento")
+        elementos_host, links_cortados = particionar_topologia(
+            config, args.e, seed, args.particoes, pasta_saida
+        )
+        progresso.fim_fase("particionamento", links_entre_hosts=links_cortados)
+        resumo += f"""
+PARTICIONAMENTO ({args.particoes} hosts):
+------------------------
+"""
+        for p, qtd in enumerate(elementos_host):
+            resumo += f"  host_{p+1:02d}: {qtd} elementos\n"
+        resumo += f"  Links entre hosts: {links_cortados} de {estatisticas.total_conexoes}\n"
+    
+    resumo += f"\nPasta de saída: {pasta_saida}\n"
+    
+    with open(f"{pasta_saida}/resumo.txt", "w", encoding="utf-8") as f:
+        f.write(resumo)
+    
+    return resumo, estado, estatisticas
+
+def diff_resumo(anterior, atual, contexto=0):
+    """Linhas alteradas entre dois resumo.txt (diff unificado, sem a data de geração)"""
+    import difflib
+    
+    def linhas(resumo):
+        return [l for l in resumo.splitlines() if not l.startswith("Data de geracao:")]
+    return [
+        l for l in difflib.unified_diff(linhas(anterior), linhas(atual), n=contexto, lineterm="")
+        if not l.startswith(("---", "+++"))
+    ]
+
+def observar_configuracao(args, seed, pasta_saida, estado, resumo, intervalo=1.0):
+    """Modo --watch: refaz a topologia na mesma pasta a cada gravação do config.
+    
+    A data de modificação do arquivo é conferida a cada 'intervalo' segundos.
+    A configuração compilada e os blocos (camada, região) da última geração
+    ficam em memória: só são sorteados de novo os blocos cujas entradas
+    mudaram, e só são montadas de novo as famílias de conexões que dependem
+    deles. Um config inválido é informado e a sessão espera a próxima
+    gravação. Ctrl+C encerra.
+    """
+    print(f"Observando {args.c} (Ctrl+C para encerrar)")
+    ultima_modificacao = os.stat(args.c).st_mtime_ns
+    try:
+        while True:
+            time.sleep(intervalo)
+            try:
+                modificacao = os.stat(args.c).st_mtime_ns
+            except OSError:
+                continue
+            if modificacao == ultima_modificacao:
+                continue
+            ultima_modificacao = modificacao
+            
+            # Um config inválido é informado e a sessão continua
+            inicio = time.monotonic()
+            try:
+                novo_config = ler_configuracao(args.c)
+                if args.m:
+                    novo_config["CIDADES_UF"] = carregar_municipios(args.m, novo_config)
+                compilar_configuracao(novo_config, estado["compilado"])
+                novo_resumo, novo_estado, _ = gerar_pasta_topologia(
+                    args, novo_config, seed, pasta_saida, ProgressoJSON(), estado
+                )
+            except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+                print(f"ERRO: Configuração inválida: {str(e)}")
+                continue
+            
+            refeitos = novo_estado["regenerados"]
+            blocos_elementos = [chave for chave in refeitos if chave in novo_estado["blocos"]]
+            print(
+                f"\n[{datetime.datetime.now().strftime('%H:%M:%S')}] {args.c} alterado:"
+                f" {len(blocos_elementos)} de {len(novo_estado['blocos'])} blocos de elementos"
+                f" e {len(refeitos) - len(blocos_elementos)} de {len(novo_estado['blocos_conexoes'])}"
+                f" famílias de conexões refeitos em {time.monotonic() - inicio:.2f}s"
+            )
+            for camada, regiao in blocos_elementos:
+                print(f"  refeito: {camada} {regiao}")
+            diferencas = diff_resumo(resumo, novo_resumo)
+            print("\n".join(diferencas) if diferencas else "resumo.txt sem alterações")
+            estado, resumo = novo_estado, novo_resumo
+    except KeyboardInterrupt:
+        print("\nModo --watch encerrado")
+
+def texto_ajuda():
+    """Texto completo do --help (montado só quando pedido)"""
+    return f"""
+GERADOR DE ELEMENTOS E CONEXÕES DE REDE PARA BACKBONE NACIONAL PARA LABORATÓRIO {VERSION}
+====================================================
+
+⭐ VISÃO GERAL
+--------------
+Gera arquivos CSV para modelagem de redes backbone hierárquicas:
+  elementos.csv    -> Equipamentos e atributos
+  conexoes.csv     -> Interconexões entre dispositivos
+  localidades.csv  -> Dados geográficos (coordenadas DMS)
+
+🚀 COMO USAR
+------------
+Formato básico:
+  python GeradorBackbone.py [OPÇÕES]
+
+Exemplos:
+  1. Topologia padrão (300 elementos):
+     python GeradorBackbone.py
+  
+  2. Topologia personalizada (500 elementos):
+     python GeradorBackbone.py -e 500 -c meu_config.json
+
+  3. Topologia reproduzível (mesma semente, mesma topologia):
+     python GeradorBackbone.py -e 500 -s 42
+
+⚙️ ARGUMENTOS:
+--------------
+  -e  Quantidade total de elementos (30-1000, padrão: 300)
+  -c  Caminho para arquivo de configuração (padrão: config.json)
+  -s  Semente aleatória para reproduzir a mesma topologia (padrão: sorteada)
+  -m  CSV de municípios (nome, UF, lat/lon, população) no lugar de CIDADES_UF
+  --exportar  Formatos extras: graphml, neo4j (ex: --exportar graphml neo4j)
+  --particoes Divide a topologia em K hosts balanceados (pasta hosts/)
+  --enderecamento  Gera enderecamento.csv (loopbacks e /31 por conexão)
+  --configs   Renderiza uma configuração por equipamento em configs/
+  --containerlab  Gera topologia.clab.yml e a estimativa de vCPUs/memória por camada
+  --processos Processos para montar as conexões por região e renderizar as configurações
+  --limiar-transbordo  Memória (MB) acima da qual os SWACs transbordam para disco (não é um teto)
+  --layout    Gera layout.csv com coordenadas x/y refinadas para visualização
+  --layout-iteracoes  Iterações do layout de forças (padrão: 20)
+  --cache     Reutiliza topologias já geradas (mesmo config, -e, -s e versão)
+  --cache-max-mb  Tamanho máximo do cache, removendo as menos usadas (padrão: 1024)
+  --diff A B  Compara duas pastas geradas (elementos, religações, deltas)
+  --watch     Refaz a topologia a cada gravação do config, só nas camadas/regiões afetadas
+  --version   Mostra a versão e sai
+
+🔧 PERSONALIZAÇÃO AVANÇADA (config.json)
+----------------------------------------
+Customize proporções e hierarquia editando:
+1. PROPORCAO_CAMADAS:
+   • Ajuste % de cada camada (ex: {{"RTIC": 0.03}} = 3% de RTICs)
+   • Camadas: RTIC, RTRR, RTPR, RTED, SWAC
+
+2. PROPORCOES_REGIAO:
+   • Redistribua elementos por região (ex: {{"Sudeste": 0.5}} = 50% no Sudeste)
+   • Regiões: Norte, Nordeste, Centro-Oeste, Sudeste, Sul
+
+3. REGIOES_HIERARQUIA:
+   • Defina hubs estratégicos e sub-regiões
+   • Exemplo: 
+        "Sudeste": {{
+            "hubs": ["São Paulo", "Rio de Janeiro"],
+            "sub-regioes": {{ ... }}
+        }}
+
+4. CIDADES_UF:
+   • Adicione novas cidades por UF:
+        "SP": [ 
+            ["Novo Município", -23.55, -46.63],
+            ...
+        ]
+
+📂 SAÍDA GERADA
+---------------
+	Pasta: TOPOLOGIA_[QTD]_[TIMESTAMP]/
+	├── elementos.csv    # Equipamentos (siteid, camada, nível)
+	├── conexoes.csv     # Conexões (ponta-a, ponta-b, tipo)
+	├── localidades.csv  # Coordenadas (DMS) e região
+	└── resumo.txt       # Estatísticas da topologia
+
+🏗️ HIERARQUIA DA REDE (5 Camadas)
+---------------------------------
+1. INNER-CORE (RTIC: 2%):
+   - Núcleo de alta capacidade
+   - Forma anéis regionais + backbone nacional
+   - Localização: Hubs estratégicos (ex: São Paulo)
+
+2. REFLECTOR (RTRR: 3%):
+   - Agregação regional
+   - Conectado a 2 RTICs
+   - Localização: Capitais de sub-regiões
+
+3. PEERING (RTPR: 3%):
+   - Interconexão com IXPs
+   - Conectado a 2 RTICs
+   - Localização: Proximidade a PTTs
+
+4. EDGE (RTED: 12%):
+   - Borda de rede
+   - Operam em pares georredudantes
+   - Conectados a RTICs e SWACs
+
+5. METRO (SWAC: 80%):
+   - Acesso metropolitano
+   - Organizados em anéis locais
+   - Conectados a pares de RTEDs
+
+⚠️ LIMITAÇÕES IMPORTANTES
+-------------------------
+• Quantidade mínima: 30 elementos
+• Máximo recomendado: 1000 elementos
+   - Limite de renderização em ferramentas visuais
+   - Desempenho degradado acima disso
+• PTTs são OBRIGATÓRIOS:
+   - Sem PTTs em uma região = menor redundância
+   - Adicione todos PTTs relevantes no config.json
+
+🔍 EXEMPLO DE CUSTOMIZAÇÃO
+--------------------------
+Para criar topologia com:
+- 20% de RTICs
+- 60% no Nordeste
+Edite config.json:
+{{
+  "PROPORCAO_CAMADAS": {{
+    "RTIC": 0.20,   # << Aumentado para 20%
+    ... 
+  }},
+  "PROPORCOES_REGIAO": {{
+    "Nordeste": 0.6, # << 60% dos elementos
+    ...
+  }}
+}}
+
+💡 DICAS RÁPIDAS
+----------------
+• Combine com GeradorTopologias para visualização com o .drawio, disponível em:
+	https://github.com/flashbsb/Network-Topology-Generator-for-Drawio
+• Use coordenadas reais em CIDADES_UF para precisão geográfica
+• Monitore resumo.txt para validar distribuição
+• Atualizações em: 
+	https://github.com/flashbsb/Backbone-Network-Topology-Generator
+"""
+
+class AcaoAjuda(argparse.Action):
+    """-h/--help: monta a descrição completa só na hora de mostrar a ajuda"""
+    
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings, dest=dest, default=default, nargs=0, help=help)
+    
+    def __call__(self, parser, namespace, values, option_string=None):
+        parser.description = texto_ajuda()
+        parser.print_help()
+        parser.exit()
+
+def main():
+    
+    # Cria o parser; a descrição completa só é montada com -h/--help
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawTextHelpFormatter,
+        add_help=False
+    )
+    parser.add_argument(
+        '-h', '--help',
+        action=AcaoAjuda,
+        help='Mostra esta ajuda e sai'
+    )
+    parser.add_argument(
+        '--version',
+        action='version',
+        version=f'%(prog)s {VERSION}',
+        help='Mostra a versão e sai'
+    )
+    
+    parser.add_argument(
+        '-e', 
+        type=int, 
+        default=300,
+        help='Quantidade total de elementos (padrão: 300)'
+    )
+    
+    parser.add_argument(
+        '-c',
+        type=str,
+        default='config.json',
+        help='Caminho para o arquivo de configuração (padrão: config.json)'
+    )
+    
+    parser.add_argument(
+        '-s',
+        type=int,
+        default=None,
+        help='Semente aleatória para reproduzir a topologia (padrão: sorteada)'
+    )
+    
+    parser.add_argument(
+        '-m',
+        type=str,
+        default=None,
+        help='CSV de municípios (nome, uf, latitude, longitude, populacao) que substitui CIDADES_UF'
+    )
+    
+    parser.add_argument(
+        '--exportar',
+        nargs='+',
+        choices=sorted(EXPORTADORES),
+        default=[],
+        help='Formatos extras de saída: graphml, neo4j'
+    )
+    
+    parser.add_argument(
+        '--particoes',
+        type=int,
+        default=None,
+        metavar='K',
+        help='Divide a topologia em K hosts balanceados, minimizando links entre eles'
+    )
+    
+    parser.add_argument(
+        '--enderecamento',
+        action='store_true',
+        help='Gera enderecamento.csv com loopbacks e redes ponto a ponto (supernets em ENDERECAMENTO)'
+    )
+    
+    parser.add_argument(
+        '--configs',
+        action='store_true',
+        help='Renderiza uma configuração por equipamento em configs/ (templates por camada)'
+    )
+    
+    parser.add_argument(
+        '--containerlab',
+        action='store_true',
+        help='Gera topologia.clab.yml (containerlab) e containerlab_recursos.csv com vCPUs/memória por camada'
+    )
+    
+    parser.add_argument(
+        '--processos',
+        type=int,
+        default=None,
+        help='Processos para montar as conexões por região (padrão: 1) e renderizar as configurações (padrão: nº de CPUs)'
+    )
+    
+    parser.add_argument(
+        '--layout',
+        action='store_true',
+        help='Gera layout.csv com coordenadas x/y (km) refinadas por layout de forças Barnes-Hut'
+    )
+    
+    parser.add_argument(
+        '--layout-iteracoes',
+        type=int,
+        default=20,
+        help='Iterações do layout de forças (padrão: 20)'
+    )
+    
+    parser.add_argument(
+        '--cache',
+        nargs='?',
+        const=PASTA_CACHE_PADRAO,
+        default=None,
+        metavar='PASTA',
+        help=f'Cache de topologias por conteúdo; exige -s (padrão: {PASTA_CACHE_PADRAO})'
+    )
+    
+    parser.add_argument(
+        '--cache-max-mb',
+        type=int,
+        default=1024,
+        help='Tamanho máximo do cache em MB (padrão: 1024)'
+    )
+    
+    parser.add_argument(
+        '--diff',
+        nargs=2,
+        metavar=('A', 'B'),
+        help='Compara duas pastas TOPOLOGIA_* geradas e mostra as diferenças'
+    )
+    
+    parser.add_argument(
+        '--limiar-transbordo', '--spill-threshold',
+        type=int,
+        default=None,
+        metavar='MB',
+        help='Memória residente (MB) a partir da qual os SWACs e seus anéis vão para blocos temporários em disco;'
+             ' as demais camadas continuam em memória, então não é um teto'
+    )
+    parser.add_argument(
+        '--progresso', '--progress',
+        choices=['json'],
+        default=None,
+        help='Emite eventos de progresso em JSON lines (stderr ou --progresso-arquivo)'
+    )
+    parser.add_argument(
+        '--progresso-arquivo',
+        type=str,
+        default=None,
+        metavar='ARQUIVO',
+        help='Arquivo para os eventos de --progresso (padrão: stderr)'
+    )
+    parser.add_argument(
+        '--watch', '--observar',
+        action='store_true',
+        help='Mantém a geração em memória e refaz só as camadas/regiões afetadas a cada gravação do config'
+    )
+    args = parser.parse_args()
+    
+    if args.diff:
+        try:
+            relatorio = comparar_topologias(*args.diff)
+        except (OSError, KeyError) as e:
+            print(f"ERRO: Falha ao ler topologia para comparação: {str(e)}")
+            sys.exit(1)
+        print(relatorio)
+        return
+
+    if args.e < 30:
+        print("ERRO: Quantidade mínima de elementos é 30")
+        sys.exit(1)
+    
+    if args.particoes is not None and args.particoes < 1:
+        print("ERRO: A quantidade de partições deve ser pelo menos 1")
+        sys.exit(1)
+    
+    # Eventos de progresso (desligados sem --progresso)
+    destino_progresso = None
+    if args.progresso_arquivo and args.progresso:
+        try:
+            destino_progresso = open(args.progresso_arquivo, "w", encoding="utf-8")
+        except OSError as e:
+            print(f"ERRO: Falha ao abrir arquivo de progresso: {str(e)}")
+            sys.exit(1)
+    elif args.progresso:
+        destino_progresso = sys.stderr
+    progresso = ProgressoJSON(destino_progresso)
+    
+    # 1. Carregar configuração
+    progresso.inicio_fase("configuracao")
+    config = carregar_configuracao(args.c)
+    if args.m:
+        try:
+            config["CIDADES_UF"] = carregar_municipios(args.m, config)
+        except (OSError, ValueError, IndexError) as e:
+            print(f"ERRO: Falha ao carregar arquivo de municípios: {str(e)}")
+            sys.exit(1)
+    
+    # Limites que dependem só do config: conferidos antes de criar a pasta
+    try:
+        largura_contador_siteid(config, calcular_distribuicao(config, args.e)[1])
+    except ValueError as e:
+        print(f"ERRO: {str(e)}")
+        sys.exit(1)
+    if args.limiar_transbordo is not None:
+        minimo_kb = memoria_minima_transbordo_kb(config, args.e)
+        if args.limiar_transbordo * 1024 < minimo_kb:
+            print(
+                f"ERRO: --limiar-transbordo {args.limiar_transbordo} MB não pode ser respeitado: mesmo com "
+                f"todos os SWACs em disco, {args.e} elementos usam cerca de {minimo_kb // 1024 + 1} MB "
+                f"(RTIC, RTRR, RTPR e RTED ficam em memória)"
+            )
+            sys.exit(1)
+    
+    progresso.fim_fase("configuracao")
+    
+    # Semente aleatória: sorteada quando não informada, e registrada no resumo
+    seed = args.s if args.s is not None else random.randrange(2**32)
+    
+    # 2. Criar pasta de saída
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    pasta_saida = f"TOPOLOGIA_{args.e}_{timestamp}"
+    # Pasta sempre nova: dois jobs no mesmo segundo não gravam um sobre o outro
+    # (nem sobre os hardlinks de uma pasta recuperada do cache)
+    sufixo = 1
+    while True:
+        try:
+            os.makedirs(pasta_saida)
+            break
+        except FileExistsError:
+            sufixo += 1
+            pasta_saida = f"TOPOLOGIA_{args.e}_{timestamp}_{sufixo}"
+    progresso.pasta_saida = pasta_saida
+    
+    if args.watch and args.limiar_transbordo is not None:
+        print("AVISO: --limiar-transbordo ignorado com --watch (os blocos ficam em memória)")
+        args.limiar_transbordo = None
+    
+    # Cache por conteúdo: só faz sentido com semente explícita
+    chave = None
+    if args.cache and args.watch:
+        print("AVISO: --cache ignorado com --watch")
+    elif args.cache and args.s is not None:
+        opcoes = {
+            "exportar": sorted(args.exportar),
+            "enderecamento": args.enderecamento,
+            "configs": carregar_templates(config) if args.configs else None,
+            "layout": args.layout_iteracoes if args.layout else None,
+            "containerlab": args.containerlab,
+            "particoes": args.particoes
+        }
+        chave = chave_cache(config, args.e, seed, opcoes)
+        progresso.inicio_fase("cache")
+        resumo = recuperar_do_cache(args.cache, chave, pasta_saida, {
+            "Arquivo de configuração": args.c, "Arquivo de municípios": args.m or "-"
+        })
+        progresso.fim_fase("cache", acerto=resumo is not None)
+        if resumo is not None:
+            progresso.evento("fim", pasta=pasta_saida, bytes=progresso.bytes_gravados())
+            print(f"Topologia recuperada do cache ({chave[:12]}) na pasta: {pasta_saida}")
+            print(resumo)
+            return
+    elif args.cache:
+        print("AVISO: --cache ignorado sem semente explícita (-s)")
+    
+    # 3. Gerar elementos e conexões direto para os arquivos
+    try:
+        resumo, estado, estatisticas = gerar_pasta_topologia(
+            args, config, seed, pasta_saida, progresso, {} if args.watch else None
+        )
+    except (ValueError, OSError) as e:
+        print(f"ERRO: {str(e)}")
+        sys.exit(1)
+    
+    if chave is not None:
+        try:
+            armazenar_no_cache(args.cache, chave, pasta_saida, args.cache_max_mb * 1024 * 1024)
+        except OSError as e:
+            print(f"AVISO: Falha ao armazenar no cache: {str(e)}")
+    progresso.evento(
+        "fim", pasta=pasta_saida, elementos=estatisticas.total_elementos,
+        conexoes=estatisticas.total_conexoes, bytes=progresso.bytes_gravados()
+    )
+    if destino_progresso is not None and destino_progresso is not sys.stderr:
+        destino_progresso.close()
+    
+    print(f"Topologia gerada com sucesso na pasta: {pasta_saida}")
+    print(resumo)
+    
+    if args.limiar_transbordo is not None:
+        pico_kb = pico_rss_kb()
+        if pico_kb is not None and pico_kb > args.limiar_transbordo * 1024:
+            print(
+                f"AVISO: pico de memória de {pico_kb // 1024} MB acima do --limiar-transbordo "
+                f"{args.limiar_transbordo} MB (o limiar só decide quando os SWACs vão para disco)"
+            )
+    
+    if args.watch:
+        observar_configuracao(args, seed, pasta_saida, estado, resumo)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,51 @@
+"""Configuração comum dos testes do GeradorBackbone"""
+
+import copy
+import os
+import random
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import GeradorBackbone as gb  # noqa: E402
+
+CONFIG_PADRAO = os.path.join(RAIZ, "config.json")
+
+
+@pytest.fixture(scope="session")
+def config_base():
+    return gb.carregar_configuracao(CONFIG_PADRAO)
+
+
+def config_aleatorio(base, semente):
+    """Variação sorteada (e reproduzível) do config padrão.
+    
+    Perturba as proporções de camadas e regiões, remove parte dos PTTs e
+    acrescenta cidades próximas às existentes em algumas UFs.
+    """
+    rng = random.Random(semente)
+    config = copy.deepcopy(base)
+    for chave in ("PROPORCAO_CAMADAS", "PROPORCOES_REGIAO"):
+        proporcoes = {nome: valor * rng.uniform(0.5, 1.5) for nome, valor in config[chave].items()}
+        soma = sum(proporcoes.values())
+        config[chave] = {nome: valor / soma for nome, valor in proporcoes.items()}
+    
+    config["PTTS"] = [ptt for ptt in config["PTTS"] if rng.random() < 0.7]
+    
+    for uf in rng.sample(sorted(config["CIDADES_UF"]), 8):
+        cidades = config["CIDADES_UF"][uf]
+        for i in range(rng.randint(1, 5)):
+            nome, lat, lon = rng.choice(cidades)[:3]
+            cidades.append((f"{nome} Teste {i + 1}", lat + rng.uniform(-1, 1), lon + rng.uniform(-1, 1)))
+    return config
+
+
+def gerar(config, total, seed, **kwargs):
+    """(elementos, conexoes, estado) de uma geração em memória"""
+    estado = {}
+    elementos = list(gb.iter_elementos(config, total, seed, estado))
+    conexoes = list(gb.iter_conexoes(config, estado=estado, **kwargs))
+    return elementos, conexoes, estado
@@ -0,0 +1,96 @@
+"""Orçamentos de tempo por fase e tamanho (regressão de desempenho).
+
+Tempos dependem da máquina e da carga, então estes testes só rodam com
+GERADOR_DESEMPENHO=1 (ou ao gravar referências); a suíte padrão fica
+determinística. Os tempos de referência ficam em orcamentos_desempenho.json; uma fase
+falha quando fica mais de 'tolerancia_pct' por cento mais lenta que a
+referência (GERADOR_TOLERANCIA_PCT sobrescreve), com uma folga mínima de
+'folga_minima_s' para as fases de poucos milissegundos. Para gravar novas
+referências nesta máquina e depois conferir:
+
+    GERADOR_GRAVAR_ORCAMENTOS=1 python -m pytest tests/test_desempenho.py
+    GERADOR_DESEMPENHO=1 python -m pytest tests/test_desempenho.py
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+from conftest import gb
+
+ARQUIVO_ORCAMENTOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "orcamentos_desempenho.json")
+REPETICOES = 3
+TAMANHOS = [5000, 50000]
+SEMENTE = 20240601
+
+# Testes de tempo: fora da suíte padrão
+orcamento_opcional = pytest.mark.skipif(
+    os.environ.get("GERADOR_DESEMPENHO") != "1" and not os.environ.get("GERADOR_GRAVAR_ORCAMENTOS"),
+    reason="orçamentos de tempo só com GERADOR_DESEMPENHO=1"
+)
+
+
+def carregar_orcamentos():
+    with open(ARQUIVO_ORCAMENTOS, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def gravar_orcamentos(orcamentos):
+    with open(ARQUIVO_ORCAMENTOS, "w", encoding="utf-8") as f:
+        json.dump(orcamentos, f, indent=2)
+        f.write("\n")
+
+
+def medir_fases(config, total, pasta):
+    """Melhor tempo (s) de cada fase em REPETICOES gerações"""
+    melhores = {}
+    for _ in range(REPETICOES):
+        tempos = {}
+        estado = {}
+        inicio = time.perf_counter()
+        elementos = list(gb.iter_elementos(config, total, SEMENTE, estado))
+        tempos["elementos"] = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        conexoes = list(gb.iter_conexoes(config, estado=estado))
+        tempos["conexoes"] = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        saida = gb.SaidaCSV(pasta)
+        for elem in elementos:
+            saida.escrever_elemento(elem)
+        for conn in conexoes:
+            saida.escrever_conexao(conn)
+        saida.fechar()
+        tempos["escrita"] = time.perf_counter() - inicio
+        
+        for fase, tempo in tempos.items():
+            melhores[fase] = min(tempo, melhores.get(fase, tempo))
+    return melhores
+
+
+@orcamento_opcional
+@pytest.mark.parametrize("total", TAMANHOS)
+def test_orcamento_por_fase(config_base, tmp_path, total):
+    medidos = medir_fases(config_base, total, str(tmp_path))
+    orcamentos = carregar_orcamentos()
+    
+    if os.environ.get("GERADOR_GRAVAR_ORCAMENTOS"):
+        orcamentos["tamanhos"][str(total)] = {fase: round(tempo, 4) for fase, tempo in medidos.items()}
+        gravar_orcamentos(orcamentos)
+        return
+    
+    referencia = orcamentos["tamanhos"].get(str(total))
+    if referencia is None:
+        pytest.skip(f"Sem orçamento gravado para {total} elementos")
+    tolerancia = float(os.environ.get("GERADOR_TOLERANCIA_PCT", orcamentos["tolerancia_pct"]))
+    folga = orcamentos["folga_minima_s"]
+    
+    estouros = [
+        f"{fase}: {medidos[fase]:.3f}s (referência {limite:.3f}s, +{tolerancia:g}%)"
+        for fase, limite in referencia.items()
+        if medidos[fase] > max(limite * (1 + tolerancia / 100), limite + folga)
+    ]
+    assert not estouros, f"{total} elementos mais lento que o orçamento: " + "; ".join(estouros)
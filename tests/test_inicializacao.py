@@ -0,0 +1,97 @@
+"""Orçamento de partida da linha de comando (python -X importtime).
+
+--version e --help não devem importar os módulos das etapas opcionais, e
+o tempo das importações e da execução de 'python -m GeradorBackbone
+--version' é comparado com 'inicializacao' em orcamentos_desempenho.json
+(mesma tolerância, GERADOR_GRAVAR_ORCAMENTOS e GERADOR_DESEMPENHO=1 de
+test_desempenho.py: sem eles, só as conferências de importação rodam).
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import RAIZ, gb
+from test_desempenho import carregar_orcamentos, gravar_orcamentos, orcamento_opcional
+
+REPETICOES = 5
+
+# Importados só pelas etapas que precisam deles
+MODULOS_ADIADOS = [
+    "concurrent.futures", "difflib", "fractions", "hashlib", "ipaddress",
+    "pickle", "shutil", "string", "tempfile", "xml.sax.saxutils"
+]
+
+
+def executar(*argumentos):
+    """(tempo em s, saída, stderr) de 'python <argumentos>' na raiz, com bytecode em cache"""
+    ambiente = dict(os.environ)
+    ambiente.pop("PYTHONDONTWRITEBYTECODE", None)
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, *argumentos], cwd=RAIZ, env=ambiente,
+        capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - inicio, processo.stdout, processo.stderr
+
+
+def tempos_importacao(stderr):
+    """módulo -> (próprio, acumulado) em microssegundos, da saída de -X importtime"""
+    tempos = {}
+    for linha in stderr.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, acumulado, modulo = linha[len("import time:"):].split("|")
+        tempos[modulo.strip()] = (int(proprio), int(acumulado))
+    return tempos
+
+
+def test_version():
+    _, saida, _ = executar("-m", "GeradorBackbone", "--version")
+    assert saida.split() == ["GeradorBackbone.py", gb.VERSION]
+
+
+def test_importacao_sem_modulos_adiados():
+    _, _, stderr = executar("-X", "importtime", "-c", "import GeradorBackbone")
+    assert not set(tempos_importacao(stderr)) & set(MODULOS_ADIADOS)
+
+
+@pytest.mark.parametrize("opcao", ["--version", "--help"])
+def test_opcoes_triviais_sem_modulos_adiados(opcao):
+    _, saida, stderr = executar("-X", "importtime", "-m", "GeradorBackbone", opcao)
+    # O próprio argparse importa shutil para medir o terminal ao formatar a saída
+    assert not set(tempos_importacao(stderr)) & (set(MODULOS_ADIADOS) - {"shutil"})
+    if opcao == "--help":
+        assert "VISÃO GERAL" in saida
+
+
+@orcamento_opcional
+def test_orcamento_partida():
+    executar("-c", "import GeradorBackbone")  # grava o bytecode em cache
+    importacoes = execucao = float("inf")
+    for _ in range(REPETICOES):
+        tempo, _, stderr = executar("-X", "importtime", "-c", "import GeradorBackbone")
+        proprio, acumulado = tempos_importacao(stderr)["GeradorBackbone"]
+        importacoes = min(importacoes, (acumulado - proprio) / 1000)
+        execucao = min(execucao, executar("-m", "GeradorBackbone", "--version")[0] * 1000)
+    medidos = {"importacoes_ms": importacoes, "versao_ms": execucao}
+    
+    orcamentos = carregar_orcamentos()
+    if os.environ.get("GERADOR_GRAVAR_ORCAMENTOS"):
+        orcamentos["inicializacao"] = {nome: round(valor, 1) for nome, valor in medidos.items()}
+        gravar_orcamentos(orcamentos)
+        return
+    
+    referencia = orcamentos.get("inicializacao")
+    if referencia is None:
+        pytest.skip("Sem orçamento de partida gravado")
+    tolerancia = float(os.environ.get("GERADOR_TOLERANCIA_PCT", orcamentos["tolerancia_pct"]))
+    estouros = [
+        f"{nome}: {medidos[nome]:.1f}ms (referência {limite:.1f}ms, +{tolerancia:g}%)"
+        for nome, limite in referencia.items()
+        if medidos[nome] > limite * (1 + tolerancia / 100)
+    ]
+    assert not estouros, "Partida mais lenta que o orçamento: " + "; ".join(estouros)
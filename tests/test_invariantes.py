@@ -0,0 +1,262 @@
+"""Invariantes da topologia gerada, em configs e tamanhos sorteados com sementes fixas"""
+
+import copy
+import re
+import subprocess
+import sys
+from collections import Counter, defaultdict
+
+import pytest
+
+from conftest import RAIZ, config_aleatorio, gb, gerar
+
+# (semente do config, total de elementos, semente da geração)
+CASOS = [
+    (1, 30, 11),
+    (2, 120, 12),
+    (3, 300, 13),
+    (4, 757, 14),
+    (5, 1000, 15),
+    (6, 2500, 16),
+    (7, 5000, 17),
+    (8, 12000, 18),
+]
+
+
+@pytest.fixture(scope="module", params=CASOS, ids=lambda c: f"config{c[0]}-e{c[1]}")
+def topologia(request, config_base):
+    semente_config, total, seed = request.param
+    config = config_aleatorio(config_base, semente_config)
+    elementos, conexoes, estado = gerar(config, total, seed)
+    return config, total, seed, elementos, conexoes, estado
+
+
+def por_tipo(elementos):
+    tipos = defaultdict(list)
+    for elem in elementos:
+        tipos[elem["tipo"]].append(elem)
+    return tipos
+
+
+def vizinhos_por_tipo(conexoes, tipo_conexao):
+    vizinhos = defaultdict(list)
+    for conn in conexoes:
+        if conn["tipo"] == tipo_conexao:
+            vizinhos[conn["ponta-a"]].append(conn["ponta-b"])
+            vizinhos[conn["ponta-b"]].append(conn["ponta-a"])
+    return vizinhos
+
+
+def test_total_e_distribuicao(topologia):
+    config, total, _, elementos, _, estado = topologia
+    assert len(elementos) == len(config["PTTS"]) + sum(estado["dist_real"].values())
+    if total >= 300:
+        # Abaixo disso os mínimos por região (hubs, sub-regiões, pares) podem não caber
+        assert len(elementos) == total
+    contagem = Counter(elem["tipo"] for elem in elementos)
+    assert contagem["PTT"] == len(config["PTTS"])
+    for camada, quantidade in estado["dist_real"].items():
+        assert contagem[camada] == quantidade
+        assert sum(estado["dist_regional"][camada].values()) == quantidade
+
+
+def test_nomes_e_siteids_unicos(topologia):
+    elementos = topologia[3]
+    nomes = [gb.remover_acentos(elem["elemento"]) for elem in elementos]
+    siteids = [gb.remover_acentos(elem["siteid"]) for elem in elementos]
+    assert len(set(nomes)) == len(nomes)
+    assert len(set(siteids)) == len(siteids)
+
+
+def test_conexoes_entre_elementos_existentes(topologia):
+    _, _, _, elementos, conexoes, _ = topologia
+    nomes = {elem["elemento"] for elem in elementos}
+    for conn in conexoes:
+        assert conn["ponta-a"] in nomes and conn["ponta-b"] in nomes
+
+
+def test_rted_em_pares(topologia):
+    _, _, _, elementos, conexoes, _ = topologia
+    tipos = por_tipo(elementos)
+    regiao = {elem["elemento"]: elem["regiao"] for elem in elementos}
+    pares = vizinhos_por_tipo(conexoes, "EDGE_PAIR")
+    rtics = {elem["elemento"] for elem in tipos["RTIC"]}
+    uplinks = vizinhos_por_tipo(conexoes, "EDGE_TO_CORE")
+    
+    assert len(tipos["RTED"]) % 2 == 0
+    for rted in tipos["RTED"]:
+        nome = rted["elemento"]
+        assert len(pares[nome]) == 1, nome
+        par = pares[nome][0]
+        assert par in {e["elemento"] for e in tipos["RTED"]}
+        assert regiao[par] == rted["regiao"]
+        assert len(uplinks[nome]) == 1 and uplinks[nome][0] in rtics
+    
+    # Os dois RTEDs do par sobem para RTICs diferentes (se houver mais de um)
+    if len(rtics) > 1:
+        for a, b in topologia[5]["rted_pares"]:
+            assert uplinks[a["elemento"]] != uplinks[b["elemento"]]
+
+
+@pytest.mark.parametrize("camada, tipo_conexao", [("RTRR", "REFLECTOR_LINK"), ("RTPR", "PEERING_LINK")])
+def test_dois_uplinks_rtic(topologia, camada, tipo_conexao):
+    _, _, _, elementos, conexoes, _ = topologia
+    tipos = por_tipo(elementos)
+    rtics = {elem["elemento"] for elem in tipos["RTIC"]}
+    uplinks = vizinhos_por_tipo(conexoes, tipo_conexao)
+    esperado = min(2, len(rtics))
+    for elem in tipos[camada]:
+        destinos = uplinks[elem["elemento"]]
+        assert len(destinos) == esperado, elem["elemento"]
+        assert len(set(destinos)) == esperado
+        assert set(destinos) <= rtics
+
+
+def test_aneis_metro_ligados_a_par_rted(topologia):
+    _, _, _, elementos, conexoes, estado = topologia
+    tipos = por_tipo(elementos)
+    pares = {frozenset((a["elemento"], b["elemento"])) for a, b in estado["rted_pares"]}
+    anel = vizinhos_por_tipo(conexoes, "METRO_RING")
+    metro_edge = vizinhos_por_tipo(conexoes, "METRO_TO_EDGE")
+    
+    cidades = defaultdict(list)
+    for swac in tipos["SWAC"]:
+        cidades[(swac["uf"], swac["cidade"])].append(swac["elemento"])
+    
+    for swacs in cidades.values():
+        # Um único ciclo com todos os SWACs da cidade
+        visitados = {swacs[0]}
+        pilha = [swacs[0]]
+        while pilha:
+            for vizinho in anel[pilha.pop()]:
+                if vizinho not in visitados:
+                    visitados.add(vizinho)
+                    pilha.append(vizinho)
+        assert visitados == set(swacs)
+        if len(swacs) > 2:
+            assert all(len(anel[s]) == 2 for s in swacs)
+        
+        # As duas extremidades sobem para os dois RTEDs de um mesmo par
+        extremidades = [s for s in swacs if metro_edge[s]]
+        rteds = frozenset(r for s in extremidades for r in metro_edge[s])
+        assert sum(len(metro_edge[s]) for s in swacs) == 2
+        if len(swacs) > 1:
+            assert len(extremidades) == 2
+        assert rteds in pares
+
+
+def test_determinismo(config_base):
+    config = config_aleatorio(config_base, 9)
+    a = gerar(config, 3000, 42)[:2]
+    b = gerar(config, 3000, 42)[:2]
+    c = gerar(config, 3000, 42, processos=2)[:2]
+    assert a == b == c
+    assert gerar(config, 3000, 43)[:2] != a
+
+
+def test_transbordo_igual_a_memoria(config_base):
+    # Limiar de 1 MB: os SWACs vão para disco assim que a memória é conferida
+    estado = {}
+    elementos = list(gb.iter_elementos(config_base, 60000, 3, estado, limiar_transbordo_mb=1))
+    conexoes = list(gb.iter_conexoes(config_base, estado=estado))
+    assert estado["swacs"].transbordou
+    assert (elementos, conexoes) == gerar(config_base, 60000, 3)[:2]
+
+
+def test_regeneracao_incremental(config_base):
+    config = config_aleatorio(config_base, 10)
+    anterior = {}
+    list(gb.iter_elementos(config, 4000, 5, anterior, anterior={}))
+    list(gb.iter_conexoes(config, estado=anterior, anterior={}))
+    
+    alterado = config_aleatorio(config_base, 10)
+    alterado["REGIOES_HIERARQUIA"]["Sul"]["sub-regioes"]["Sul2"].reverse()
+    estado = {}
+    elementos = list(gb.iter_elementos(alterado, 4000, 5, estado, anterior=anterior))
+    conexoes = list(gb.iter_conexoes(alterado, estado=estado, anterior=anterior))
+    assert (elementos, conexoes) == gerar(alterado, 4000, 5)[:2]
+    assert {camada for camada, regiao in estado["regenerados"] if regiao != "Sul"} == set()
+
+
+def test_regeneracao_incremental_segunda_ponta_rted(config_base):
+    # Com 600 elementos e semente 58, Gurupi/TO é só a segunda ponta do par
+    # RTED-TO03: movê-la muda os anéis metro ligados a esse par em outras UFs
+    anterior = {}
+    list(gb.iter_elementos(config_base, 600, 58, anterior, anterior={}))
+    list(gb.iter_conexoes(config_base, estado=anterior, anterior={}))
+    assert [b["elemento"] for a, b in anterior["rted_pares"] if b["cidade"] == "Gurupi"] == ["RTED-TO03-02"]
+    assert "Gurupi" not in {a["cidade"] for a, b in anterior["rted_pares"]}
+    
+    alterado = copy.deepcopy(config_base)
+    alterado["CIDADES_UF"]["TO"] = [
+        (nome, lat + 3, lon + 1, *resto) if nome == "Gurupi" else (nome, lat, lon, *resto)
+        for nome, lat, lon, *resto in alterado["CIDADES_UF"]["TO"]
+    ]
+    estado = {}
+    elementos = list(gb.iter_elementos(alterado, 600, 58, estado, anterior=anterior))
+    conexoes = list(gb.iter_conexoes(alterado, estado=estado, anterior=anterior))
+    assert (elementos, conexoes) == gerar(alterado, 600, 58)[:2]
+
+
+def contar_linhas(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return sum(1 for _ in f) - 1
+
+
+@pytest.mark.parametrize("total, seed", [(300, 1), (4321, 2)])
+def test_csv_confere_com_resumo(tmp_path, total, seed):
+    subprocess.run(
+        [sys.executable, f"{RAIZ}/GeradorBackbone.py", "-e", str(total), "-s", str(seed),
+         "-c", f"{RAIZ}/config.json"],
+        cwd=tmp_path, check=True, capture_output=True
+    )
+    pasta, = tmp_path.glob("TOPOLOGIA_*")
+    resumo = (pasta / "resumo.txt").read_text(encoding="utf-8")
+    
+    registros = dict(re.findall(r"^\d+\. (\w+\.csv): (\d+) registros$", resumo, re.M))
+    assert set(registros) == {"elementos.csv", "conexoes.csv", "localidades.csv"}
+    for arquivo, quantidade in registros.items():
+        assert contar_linhas(pasta / arquivo) == int(quantidade), arquivo
+    
+    assert int(re.search(r"^Total de elementos: (\d+)$", resumo, re.M)[1]) == total
+    assert int(re.search(r"^Total de conexões: (\d+)$", resumo, re.M)[1]) == int(registros["conexoes.csv"])
+    
+    with open(pasta / "elementos.csv", encoding="utf-8") as f:
+        camadas = Counter(linha.split(";")[1] for linha in list(f)[1:])
+    por_camada = re.findall(r"^([A-Z-]+)(?: \(\w+\))?: (\d+) elementos$", resumo, re.M)
+    assert len(por_camada) == 6
+    for camada, quantidade in por_camada:
+        assert camadas[camada] == int(quantidade), camada
+
+
+def test_config_alterado_no_lugar(config_base):
+    config = config_aleatorio(config_base, 11)
+    gerar(config, 500, 1)
+    config["CIDADES_UF"]["SP"].append(("Cidade Nova", -23.0, -47.0))
+    elementos = gerar(config, 500, 1)[0]
+    assert ("Cidade Nova", "SP", -23.0, -47.0) in gb.compilar_configuracao(config)["cidades_por_regiao"]["Sudeste"]
+    assert elementos == gerar(copy.deepcopy(config), 500, 1)[0]
+
+
+def test_cache_isolado_da_pasta_de_saida(tmp_path):
+    origem, recuperada, cache = tmp_path / "A", tmp_path / "B", tmp_path / "cache"
+    subprocess.run(
+        [sys.executable, f"{RAIZ}/GeradorBackbone.py", "-e", "300", "-s", "7",
+         "-c", f"{RAIZ}/config.json"],
+        cwd=tmp_path, check=True, capture_output=True
+    )
+    pasta, = tmp_path.glob("TOPOLOGIA_*")
+    pasta.rename(origem)
+    elementos = (origem / "elementos.csv").read_text(encoding="utf-8")
+    gb.armazenar_no_cache(str(cache), "chave", str(origem), 1 << 30)
+    
+    # Regravar a pasta de origem não altera o cache nem as pastas recuperadas
+    (origem / "elementos.csv").write_text("regravado\n", encoding="utf-8")
+    resumo = gb.recuperar_do_cache(str(cache), "chave", str(recuperada), {
+        "Arquivo de configuração": "outro.json", "Arquivo de municípios": "municipios.csv"
+    })
+    assert (recuperada / "elementos.csv").read_text(encoding="utf-8") == elementos
+    assert "Arquivo de configuração: outro.json\n" in resumo
+    assert "Arquivo de municípios: municipios.csv\n" in resumo
+    assert f"Pasta de saída: {recuperada}\n" in resumo
+    assert (recuperada / "resumo.txt").read_text(encoding="utf-8") == resumo